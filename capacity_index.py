@@ -0,0 +1,40 @@
+import numpy as np
+
+class CapacityIndex:
+    '''
+    Segment tree of the max remaining resource (cr, avg_bw_up, avg_bw_down) over the candidate vm of a task type.
+    Query descends only into the subtrees whose max resource can fit the task, level by level.
+    '''
+    def __init__(self, resources: np.array):
+        self.vm_num = len(resources)
+        self.leaf_start = 1
+        while self.leaf_start < self.vm_num:
+            self.leaf_start *= 2
+        # node i has children 2i and 2i+1, the padding leaves never fit any task
+        self.tree = np.full((2 * self.leaf_start, 3), -np.inf)
+        self.tree[self.leaf_start:self.leaf_start + self.vm_num] = np.reshape(resources, (-1, 3))
+        level_start = self.leaf_start
+        while level_start > 1:
+            parents = np.arange(level_start // 2, level_start)
+            self.tree[parents] = np.maximum(self.tree[2 * parents], self.tree[2 * parents + 1])
+            level_start //= 2
+
+    def update(self, idx: int, resource: tuple) -> None:
+        '''Set the remaining resource of the idx-th vm and update its ancestors.'''
+        node = self.leaf_start + idx
+        self.tree[node] = resource
+        node //= 2
+        while node >= 1:
+            self.tree[node] = np.maximum(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def query(self, need: tuple) -> np.array:
+        '''Get the index of vm whose remaining resource are all not less than need, in increasing order.'''
+        nodes = np.array([1])
+        while True:
+            nodes = nodes[np.all(self.tree[nodes] >= need, axis=1)]
+            if nodes.size == 0 or nodes[0] >= self.leaf_start:
+                break
+            nodes = np.column_stack((2 * nodes, 2 * nodes + 1)).reshape(-1)
+        positions = nodes - self.leaf_start
+        return positions[positions < self.vm_num]
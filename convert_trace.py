@@ -0,0 +1,7 @@
+from parameters import test_data_dir
+from event_table import Event_table
+
+# convert the json traces into binary columnar traces, main.py memory-maps them instead of parsing the json.
+for name in ['task_events', 'history_data']:
+    Event_table.from_json(test_data_dir + f'{name}.json').sorted_by_time().save(test_data_dir + f'{name}/')
+    print(f'Save {test_data_dir}{name}.json to {test_data_dir}{name}/!')
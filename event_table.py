@@ -0,0 +1,122 @@
+import json
+import os
+import numpy as np
+from parameters import (Task_event_index, Task_type_index)
+
+class Event_table:
+    '''
+    Columnar task events with one typed column per Task_event_index field.
+    task_type is stored as the Task_type_index value and user_id as the index of user_categories.
+    Row access gives the event as list with the original values, column access gives the typed column.
+    '''
+    dtypes = {
+        Task_event_index.index: np.int64,
+        Task_event_index.event_type: np.int8,
+        Task_event_index.event_time: np.int64,
+        Task_event_index.task_type: np.int8,
+        Task_event_index.user_id: np.int64,
+        Task_event_index.cpu_request: np.float64,
+        Task_event_index.average_cpu_usage: np.float64,
+        Task_event_index.T_up: np.float64,
+        Task_event_index.T_down: np.float64
+    }
+    task_type_names = np.array([task_type.name for task_type in Task_type_index])
+
+    def __init__(self, columns: list, user_categories: np.array):
+        self.columns = columns
+        self.user_categories = user_categories
+
+    @classmethod
+    def from_events(cls, events: list, user_categories: np.array = None):
+        '''Build the table from events as rows, encode user_id by user_categories if given, raise ValueError for unknown user_id.'''
+        fields = list(zip(*events)) if len(events) != 0 else [() for _ in Task_event_index]
+        columns = []
+        for field in Task_event_index:
+            data = fields[field.value]
+            if field == Task_event_index.task_type:
+                names, codes = np.unique(np.array(data, dtype=str), return_inverse=True)
+                column = np.array([Task_type_index[name].value for name in names], dtype=np.int64)[codes]
+            elif field == Task_event_index.user_id:
+                if user_categories is None:
+                    user_categories, column = np.unique(np.array(data, dtype=str), return_inverse=True)
+                else:
+                    values = np.array(data, dtype=str)
+                    column = np.searchsorted(user_categories, values)
+                    # searchsorted gives the insert position of the user_id not in user_categories
+                    known = column < len(user_categories)
+                    known[known] = user_categories[column[known]] == values[known]
+                    if not np.all(known):
+                        raise ValueError(f'unknown user_id {values[~known][0]} of user_categories')
+            else:
+                column = data
+            columns.append(np.array(column, dtype=cls.dtypes[field]).reshape(-1))
+        if user_categories is None:
+            user_categories = np.array([], dtype=str)
+        return cls(columns, user_categories)
+
+    @classmethod
+    def from_json(cls, filename: str):
+        '''Build the table from task_events.json or history_data.json.'''
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        return cls.from_events(data)
+
+    @classmethod
+    def load(cls, dirname: str, mmap_mode: str = 'r'):
+        '''Load the table saved by save, the columns are memory-mapped by default.'''
+        columns = [np.load(dirname + f'{field.name}.npy', mmap_mode=mmap_mode) for field in Task_event_index]
+        return cls(columns, np.load(dirname + 'user_categories.npy'))
+
+    def save(self, dirname: str) -> None:
+        '''Save each column as .npy file in dirname.'''
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        for field in Task_event_index:
+            np.save(dirname + f'{field.name}.npy', np.ascontiguousarray(self.columns[field]))
+        np.save(dirname + 'user_categories.npy', self.user_categories)
+
+    def sorted_by_time(self):
+        '''Get the table stable sorted by event_time, the events with the same event_time keep their order.'''
+        event_time = self.columns[Task_event_index.event_time]
+        if np.all(event_time[:-1] <= event_time[1:]):
+            return self
+        return self[np.argsort(event_time, kind='stable')]
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def __getitem__(self, key):
+        '''
+        table[i]: the i-th event as list.
+        table[rows]: the table of selected rows by slice, boolean mask or index array.
+        table[rows, field]: the typed column of field, a slice of fields gives shape (N, fields).
+        '''
+        if isinstance(key, tuple):
+            rows, field = key
+            columns = self.columns[field]
+            if isinstance(field, slice):
+                return np.column_stack([column[rows] for column in columns]).reshape(-1, len(columns))
+            return columns[rows]
+        if isinstance(key, (int, np.integer)):
+            return self.get_events([key])[0]
+        return Event_table([column[key] for column in self.columns], self.user_categories)
+
+    def __iter__(self):
+        return iter(self.get_events())
+
+    def __str__(self) -> str:
+        return str(np.array(self.get_events(), dtype=list).reshape(-1, len(Task_event_index)))
+
+    def decode(self, field: Task_event_index, rows=slice(None)) -> np.array:
+        '''Get the original values of the selected rows of the categorical column, only the selected rows are decoded.'''
+        column = self.columns[field][rows]
+        if field == Task_event_index.task_type:
+            return self.task_type_names[column]
+        elif field == Task_event_index.user_id:
+            return self.user_categories[column]
+        return column
+
+    def get_events(self, rows=slice(None)) -> list:
+        '''Get the selected events as rows of the original values.'''
+        fields = [self.decode(field, rows).tolist() for field in Task_event_index]
+        return [list(event) for event in zip(*fields)]
@@ -0,0 +1,158 @@
+import atexit
+import json
+import os
+import queue
+import threading
+from enum import (IntEnum, unique)
+import numpy as np
+from parameters import (Global, Task_event_index, Task_type_index)
+
+@unique
+class Trace_kind(IntEnum):
+    deploy = 0
+    block = 1
+    reschedule = 2
+    bind = 3
+    release = 4
+
+class Event_trace:
+    '''
+    Binary trace of the task deployment decisions as fixed-width records, written to filename.
+    The records are buffered and the full buffers are written by a background thread, the dtype, the kinds,
+    the operators and the vm id of the vm column are described in filename + '.json' for Event_trace_reader.
+    deploy, block and reschedule record the resource of task, bind and release record the remaining resource of vm.
+    '''
+    dtype = np.dtype([
+        ('kind', np.int8),
+        ('operator', np.int8),
+        ('task_type', np.int8),
+        # the position of vm in vm_id of the description, -1 for no vm
+        ('vm', np.int32),
+        ('time', np.int64),
+        ('task_id', np.int64),
+        # the start time of the rescheduled task, 0 for other kinds
+        ('retry_time', np.int64),
+        ('utility', np.float64),
+        ('cr', np.float64),
+        ('bw_up', np.float64),
+        ('bw_down', np.float64)
+    ])
+    operators = ['MNO', 'MVNO']
+    # None when the trace is not opened
+    file = None
+    vm_position = {}
+    buffer = np.empty(0, dtype=dtype)
+    size = 0
+    blocks = None
+    writer = None
+
+    @classmethod
+    def open(cls, filename: str, vm_id_list: list, buffer_size: int = 4096) -> None:
+        '''Start writing the trace into filename.'''
+        cls.close()
+        with open(filename + '.json', 'w') as f:
+            json.dump({
+                'dtype': [(name, cls.dtype[name].str) for name in cls.dtype.names],
+                'kinds': [kind.name for kind in Trace_kind],
+                'operators': cls.operators,
+                'vm_id': [str(vm_id) for vm_id in vm_id_list]
+            }, f)
+        cls.file = open(filename, 'wb')
+        cls.vm_position = {vm_id: idx for idx, vm_id in enumerate(vm_id_list)}
+        cls.buffer = np.empty(buffer_size, dtype=cls.dtype)
+        cls.size = 0
+        cls.blocks = queue.Queue()
+        cls.writer = threading.Thread(target=cls.write_blocks, args=(cls.file, cls.blocks), daemon=True)
+        cls.writer.start()
+
+    @staticmethod
+    def write_blocks(file, blocks: queue.Queue) -> None:
+        '''Write the blocks of records in order until None comes.'''
+        while True:
+            block = blocks.get()
+            if block is None:
+                break
+            block.tofile(file)
+
+    @classmethod
+    def is_open(cls) -> bool:
+        return cls.file is not None
+
+    @classmethod
+    def record(cls, kind: Trace_kind, task: list, operator: str, vm_id=None, utility: float = np.nan,
+               resource: tuple = None, retry_time: int = 0) -> None:
+        '''Record the decision on task, resource is (cr, bw_up, bw_down) of task by default.'''
+        if cls.file is None:
+            return
+        if resource is None:
+            resource = (task[Task_event_index.average_cpu_usage.value], task[Task_event_index.T_up.value],
+                        task[Task_event_index.T_down.value])
+        cls.buffer[cls.size] = (kind, cls.operators.index(operator), Task_type_index[task[Task_event_index.task_type.value]],
+                                cls.vm_position.get(vm_id, -1), Global.system_time, task[Task_event_index.index.value],
+                                retry_time, utility) + tuple(resource)
+        cls.size += 1
+        if cls.size == len(cls.buffer):
+            cls.flush()
+
+    @classmethod
+    def flush(cls) -> None:
+        '''Hand the buffered records to the writer thread.'''
+        if cls.size != 0:
+            cls.blocks.put(cls.buffer[:cls.size])
+            cls.buffer = np.empty(len(cls.buffer), dtype=cls.dtype)
+            cls.size = 0
+
+    @classmethod
+    def close(cls) -> None:
+        '''Write the rest of records and wait for the writer thread.'''
+        if cls.file is None:
+            return
+        cls.flush()
+        cls.blocks.put(None)
+        cls.writer.join()
+        cls.file.close()
+        cls.file = None
+
+# a single exit hook writes the rest of records of the trace left open, however many times it is opened
+atexit.register(Event_trace.close)
+
+class Event_trace_reader:
+    '''Query the records of the trace written by Event_trace, the records are memory-mapped.'''
+    def __init__(self, filename: str):
+        with open(filename + '.json', 'r') as f:
+            description = json.load(f)
+        self.dtype = np.dtype([tuple(field) for field in description['dtype']])
+        self.kinds = description['kinds']
+        self.operators = description['operators']
+        self.vm_id = np.array(description['vm_id'])
+        self.records = np.empty(0, dtype=self.dtype)
+        # the complete records only, the last one may be partially written by a running or killed writer
+        count = os.path.getsize(filename) // self.dtype.itemsize
+        # np.memmap cannot map an empty file
+        if count != 0:
+            self.records = np.memmap(filename, dtype=self.dtype, mode='r', shape=(count,))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def query(self, kind: str = None, operator: str = None, task_id: int = None, vm_id: str = None,
+              time_range: tuple = None) -> np.array:
+        '''Get the records matching all the given conditions, time_range is [start, end).'''
+        mask = np.ones(len(self.records), dtype=bool)
+        if kind is not None:
+            mask &= self.records['kind'] == self.kinds.index(kind)
+        if operator is not None:
+            mask &= self.records['operator'] == self.operators.index(operator)
+        if task_id is not None:
+            mask &= self.records['task_id'] == task_id
+        if vm_id is not None:
+            mask &= np.isin(self.records['vm'], np.flatnonzero(self.vm_id == str(vm_id)))
+        if time_range is not None:
+            mask &= (self.records['time'] >= time_range[0]) & (self.records['time'] < time_range[1])
+        return self.records[mask]
+
+    def count(self, field: str = 'kind') -> dict:
+        '''Count the records by the value of field, kind and operator are counted by name.'''
+        values, counts = np.unique(self.records[field], return_counts=True)
+        names = {'kind': self.kinds, 'operator': self.operators, 'vm': self.vm_id}.get(field)
+        return {(names[value] if names is not None and value >= 0 else value.item()): int(count) for value, count in zip(values, counts)}
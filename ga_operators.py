@@ -0,0 +1,60 @@
+import numpy as np
+
+def two_point_crossover(parents: np.array, high: int) -> tuple[np.array, int, int, np.array]:
+    '''
+    Swap the genes between two random points [left, right] among the parents in a shuffled order, in place.
+    Return the offsprings, left, right and the order after shuffle.
+    '''
+    points = [np.random.randint(0, high) for _ in range(2)]
+    left, right = min(points), max(points)
+    order = np.arange(len(parents))
+    np.random.shuffle(order)
+    parents[:, left:right + 1] = parents[order, left:right + 1]
+    return parents, left, right, order
+
+def mutation_mask(shape: tuple, rate: float) -> np.array:
+    '''Random mask of the genes to mutate with probability rate, drawn as np.random.choice did for one offspring.'''
+    return np.random.choice([True, False], shape, p=[rate, 1 - rate])
+
+def flip_mutation(offsprings: np.array, rate: float, regenerate, seed_compatible: bool) -> tuple[np.array, np.array, np.array]:
+    '''
+    Replace each offspring by regenerate() with probability rate, otherwise flip each of its bits with probability rate, in place.
+    With seed_compatible, the random numbers are drawn offspring by offspring in the same order as before.
+    Return the offsprings, the regenerated offsprings shape (offspring,) and the flipped bits shape (offspring, gene).
+    '''
+    regenerated = np.zeros(len(offsprings), dtype=bool)
+    mask = np.zeros(offsprings.shape, dtype=bool)
+    if seed_compatible:
+        for i in range(len(offsprings)):
+            regenerated[i] = np.random.random() < rate
+            if regenerated[i]:
+                offsprings[i] = regenerate()
+            else:
+                mask[i] = mutation_mask(offsprings[i].shape, rate)
+                offsprings[i] ^= mask[i]
+        return offsprings, regenerated, mask
+    regenerated = np.random.random(len(offsprings)) < rate
+    mask = (np.random.random(offsprings.shape) < rate) & ~regenerated[:, None]
+    offsprings ^= mask
+    for i in np.flatnonzero(regenerated):
+        offsprings[i] = regenerate()
+    return offsprings, regenerated, mask
+
+def scale_mutation(offsprings: np.array, rate: float, factors: tuple, seed_compatible: bool) -> tuple[np.array, np.array, np.array]:
+    '''
+    Multiply each gene with probability rate by one of the two factors with equal probability, in place.
+    With seed_compatible, the random numbers are drawn offspring by offspring in the same order as before.
+    Return the offsprings, the mutated genes and the factor of each gene, both shape (offspring, gene).
+    '''
+    if seed_compatible:
+        mask = np.zeros(offsprings.shape, dtype=bool)
+        coins = np.ones(offsprings.shape)
+        for i in range(len(offsprings)):
+            mask[i] = mutation_mask(offsprings[i].shape, rate)
+            coins[i, mask[i]] = np.random.random(np.count_nonzero(mask[i]))
+    else:
+        mask = np.random.random(offsprings.shape) < rate
+        coins = np.random.random(offsprings.shape)
+    scale = np.where(coins < 0.5, factors[0], factors[1])
+    offsprings[mask] = offsprings[mask] * scale[mask]
+    return offsprings, mask, scale
@@ -0,0 +1,30 @@
+import numpy as np
+
+class History_buffer:
+    '''
+    Ring buffer of the latest capacity hourly statistic data, shape: (hour, 3, 3).
+    The new hours overwrite the oldest ones, so the memory and the cost of append do not grow with the history.
+    '''
+    def __init__(self, capacity: int, shape: tuple = (3, 3), dtype=float):
+        self.data = np.zeros((capacity,) + shape, dtype=dtype)
+        # the number of hours appended since the start, the next hour is written at size % capacity
+        self.size = 0
+
+    def __len__(self) -> int:
+        '''The number of hours kept.'''
+        return min(self.size, len(self.data))
+
+    def append(self, hours: np.array) -> None:
+        '''Append the hourly statistic data, the hours beyond capacity only keep the latest ones.'''
+        hours = np.reshape(hours, (-1,) + self.data.shape[1:])
+        dropped = max(0, len(hours) - len(self.data))
+        hours = hours[dropped:]
+        self.size += dropped
+        positions = np.arange(self.size, self.size + len(hours)) % len(self.data)
+        self.data[positions] = hours
+        self.size += len(hours)
+
+    def get(self, start: int = None, stop: int = None) -> np.array:
+        '''Get the kept hours in time order sliced by [start:stop], e.g. get(-168, -145) for the day a week ago.'''
+        positions = np.arange(self.size - len(self), self.size)[start:stop] % len(self.data)
+        return self.data[positions]
@@ -0,0 +1,121 @@
+import csv
+import functools
+import json
+import math
+from time import perf_counter
+from parameters import (Global, instrumentation)
+
+class Histogram:
+    '''Count, sum, min, max and log-scale buckets of the observed values, the quantiles are within 1/resolution octave.'''
+    resolution = 8
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.
+        self.min = math.inf
+        self.max = -math.inf
+        # map from bucket floor(log2(value) * resolution) to count, None for the values not above 0
+        self.buckets = {}
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = math.floor(math.log2(value) * self.resolution) if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        '''The approximate q quantile, the middle of the bucket holding it.'''
+        seen = 0
+        for bucket in sorted(self.buckets, key=lambda bucket: -math.inf if bucket is None else bucket):
+            seen += self.buckets[bucket]
+            if seen >= q * self.count:
+                value = 0. if bucket is None else 2 ** ((bucket + 0.5) / self.resolution)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+class Instruments:
+    '''
+    Registry of named counters and histograms of the hot paths, enabled by instrumentation in parameters.py.
+    Each value is accumulated into the hour, round and run scopes, snapshot(scope) keeps the values of the scope
+    since its last snapshot as rows and starts it over, export writes the rows as csv and json.
+    The recording is a no-op when disabled, and timed keeps the function as is.
+    '''
+    enabled = instrumentation
+    scopes = ('hour', 'round', 'run')
+    counters = {scope: {} for scope in scopes}
+    histograms = {scope: {} for scope in scopes}
+    # the wall time each scope started
+    start_time = {scope: perf_counter() for scope in scopes}
+    snapshots = []
+    fields = ['scope', 'label', 'system_time', 'wall_time', 'name', 'type', 'count', 'rate', 'sum', 'mean', 'min', 'max',
+              'p50', 'p90', 'p99']
+
+    @classmethod
+    def count(cls, name: str, value: int = 1) -> None:
+        '''Add value to the counter name.'''
+        if not cls.enabled:
+            return
+        for counters in cls.counters.values():
+            counters[name] = counters.get(name, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float) -> None:
+        '''Add value to the histogram name.'''
+        if not cls.enabled:
+            return
+        for histograms in cls.histograms.values():
+            if name not in histograms:
+                histograms[name] = Histogram()
+            histograms[name].observe(value)
+
+    @classmethod
+    def timed(cls, name: str):
+        '''Decorator observing the wall time of each call in the histogram name, decorate after setting enabled.'''
+        def decorate(func):
+            if not cls.enabled:
+                return func
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    cls.observe(name, perf_counter() - start)
+            return wrapper
+        return decorate
+
+    @classmethod
+    def snapshot(cls, scope: str, label) -> list:
+        '''Keep the counters and histograms of scope since its last snapshot as rows, and start the scope over.'''
+        if not cls.enabled:
+            return []
+        wall_time = perf_counter() - cls.start_time[scope]
+        base = {'scope': scope, 'label': label, 'system_time': Global.system_time, 'wall_time': wall_time}
+        rows = []
+        for name, value in sorted(cls.counters[scope].items()):
+            # the count per second of wall time, e.g. events processed per second
+            rate = value / wall_time if wall_time > 0 else math.nan
+            rows.append({**base, 'name': name, 'type': 'counter', 'count': value, 'rate': rate})
+        for name, histogram in sorted(cls.histograms[scope].items()):
+            rows.append({**base, 'name': name, 'type': 'histogram', 'count': histogram.count, 'sum': histogram.sum,
+                         'mean': histogram.sum / histogram.count, 'min': histogram.min, 'max': histogram.max,
+                         'p50': histogram.quantile(0.5), 'p90': histogram.quantile(0.9), 'p99': histogram.quantile(0.99)})
+        cls.snapshots.extend(rows)
+        cls.counters[scope] = {}
+        cls.histograms[scope] = {}
+        cls.start_time[scope] = perf_counter()
+        return rows
+
+    @classmethod
+    def export(cls, filename: str) -> None:
+        '''Write the rows of all snapshots into filename + '.csv' and filename + '.json'.'''
+        if not cls.enabled:
+            return
+        with open(filename + '.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=cls.fields)
+            writer.writeheader()
+            writer.writerows(cls.snapshots)
+        with open(filename + '.json', 'w') as f:
+            json.dump(cls.snapshots, f, indent=1)
@@ -0,0 +1,116 @@
+import hashlib
+import numpy as np
+from utils import mix64
+from parameters import rnd_seed
+
+class Link_table:
+    '''
+    Link data (bw_up, bw_down, delay) from user to vm.
+    Eager: the links of new users are given by add_users and kept as array shape (user, vm, 3), the rows of
+    new users are appended into the spare rows, and the rows double when they are used up.
+    Lazy: a link is generated when it is read, from the key of the (user, vm) pair seeded by rnd_seed, so the
+    value does not depend on when or in which order the links are read. The average bw of get_avg_bw is the mean
+    of the link distribution of the vm location instead of the mean over the users, so no link is generated before it is read.
+    '''
+    dtype = np.float32
+    fields = ('bw_up', 'bw_down', 'delay')
+    # map from vm id to the column
+    vm_position = {}
+    # map from user id to the row
+    user_row = {}
+    # the rows after size are spare
+    data = np.empty((0, 0, 3), dtype=dtype)
+    size = 0
+    # generator(location, keys) of the lazy links, keys maps from field to the uint64 keys of pairs, None for eager
+    generator = None
+    # the location and the uint64 key of each vm by column, the uint64 key of each user by row
+    vm_location = np.empty(0, dtype=str)
+    vm_key = np.empty(0, dtype=np.uint64)
+    user_key = []
+    # map from location to the mean (bw_up, bw_down) of its link distribution, estimated on sample_size keyed links
+    location_avg_bw = {}
+    sample_size = 1 << 16
+
+    @classmethod
+    def load(cls, vm_id_list: list, vm_location: list, generator=None) -> None:
+        '''Build the empty table of the vm, the links are generated lazily by generator if given.'''
+        cls.vm_position = {vm_id: idx for idx, vm_id in enumerate(vm_id_list)}
+        cls.user_row = {}
+        cls.data = np.empty((0, len(vm_id_list), 3), dtype=cls.dtype)
+        cls.size = 0
+        cls.generator = generator
+        cls.vm_location = np.array(vm_location, dtype=str)
+        cls.vm_key = np.array([cls.get_key('vm', vm_id) for vm_id in vm_id_list], dtype=np.uint64)
+        cls.user_key = []
+        cls.location_avg_bw = {}
+
+    @classmethod
+    def is_lazy(cls) -> bool:
+        return cls.generator is not None
+
+    @staticmethod
+    def get_key(kind: str, id) -> int:
+        '''The uint64 key of user or vm id seeded by rnd_seed, stable across runs unlike hash().'''
+        digest = hashlib.blake2b(f'{rnd_seed}:{kind}:{id}'.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    @classmethod
+    def has_user(cls, user_id: str) -> bool:
+        return user_id in cls.user_row
+
+    @classmethod
+    def add_users(cls, user_id_list: list, links: np.array = None) -> None:
+        '''Append the new users with their links shape (user, vm, 3), links are not needed when lazy.'''
+        size = cls.size + len(user_id_list)
+        if not cls.is_lazy():
+            if size > len(cls.data):
+                data = np.empty((max(size, 2 * len(cls.data)),) + cls.data.shape[1:], dtype=cls.dtype)
+                data[:cls.size] = cls.data[:cls.size]
+                cls.data = data
+            cls.data[cls.size:size] = links
+        for row, user_id in enumerate(user_id_list, cls.size):
+            cls.user_row[user_id] = row
+            cls.user_key.append(cls.get_key('user', user_id))
+        cls.size = size
+
+    @classmethod
+    def generate_links(cls, user_key: np.array, positions: np.array) -> np.array:
+        '''Generate the links from the users of user_key to the vm at positions, shape: (user, vm, 3).'''
+        links = np.empty((len(user_key), len(positions), 3), dtype=cls.dtype)
+        pair_key = mix64(mix64(user_key)[:, None] ^ cls.vm_key[positions])
+        locations = cls.vm_location[positions]
+        for location in np.unique(locations):
+            columns = locations == location
+            data = cls.generate(location, pair_key[:, columns].reshape(-1))
+            for idx, field in enumerate(cls.fields):
+                links[:, columns, idx] = data[field].reshape(len(user_key), -1)
+        return links
+
+    @classmethod
+    def generate(cls, location: str, keys: np.array) -> dict:
+        '''Generate the link of location for each uint64 key, as map from field to np.array.'''
+        return cls.generator(location, keys={field: mix64(keys ^ np.uint64(idx + 1)) for idx, field in enumerate(cls.fields)})
+
+    @classmethod
+    def get_user_links(cls, user_id: str, positions: np.array) -> np.array:
+        '''Get the links from user to the vm at positions, shape: (vm, 3).'''
+        if cls.is_lazy():
+            return cls.generate_links(np.array([cls.user_key[cls.user_row[user_id]]], dtype=np.uint64), positions)[0]
+        return cls.data[cls.user_row[user_id], positions]
+
+    @classmethod
+    def get_avg_bw(cls) -> tuple[np.array, np.array]:
+        '''Get the average bw_up and bw_down from all user to each vm, shape: (vm,).'''
+        if not cls.is_lazy():
+            # sum up the users one by one, same order as adding them
+            total = np.sum(cls.data[:cls.size, :, :2], axis=0, dtype=float)
+            return total[:, 0] / cls.size, total[:, 1] / cls.size
+        # the links of a location are identically distributed, so the mean over the users tends to the mean of the distribution
+        avg_bw = np.empty((len(cls.vm_location), 2))
+        for location in np.unique(cls.vm_location):
+            if location not in cls.location_avg_bw:
+                keys = mix64(np.arange(cls.sample_size, dtype=np.uint64) ^ np.uint64(cls.get_key('sample', location)))
+                data = cls.generate(location, keys)
+                cls.location_avg_bw[location] = (np.mean(data['bw_up']), np.mean(data['bw_down']))
+            avg_bw[cls.vm_location == location] = cls.location_avg_bw[location]
+        return avg_bw[:, 0], avg_bw[:, 1]
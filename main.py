@@ -1,9 +1,17 @@
 import json
+import os
 import numpy as np
 from network_operator import (MNO, MVNO)
 from vm import VM
 from task_handler import Task_handler
-from utils import (toSoftmax, step_logger, beta, PT5, Metrics)
+from event_table import Event_table
+from trace_reader import Trace_reader
+from link_table import Link_table
+from history_buffer import History_buffer
+from event_trace import Event_trace
+from instruments import Instruments
+from metrics_store import Metrics_store
+from utils import (toSoftmax, step_logger, beta, PT5, Metrics, lazy_message, task_logger)
 from parameters import *
 
 # initial setting for logging
@@ -21,16 +29,23 @@ class ContextFileter(logging.Filter):
         record.system_time = Global.system_time
         return True
 logger.addFilter(ContextFileter())
+task_logger.addFilter(ContextFileter())
+## quiet mode drops the per task and per hour log
+if quiet_logging:
+    task_logger.setLevel(logging.WARNING)
 
 # fix numpy random seed and showing format
 np.random.seed(rnd_seed)
 np.set_printoptions(precision=2, suppress=True)
 
-def load_task_data(filename: str) -> np.array:
-    '''Load task_events.json and history_data.json from filename.'''
-    with open(filename, 'r') as f:
-        data = json.load(f)
-    return np.array(data, dtype=list)
+def load_task_data(filename: str) -> Event_table:
+    '''
+    Load task_events and history_data from filename.
+    Memory-map the binary trace directory made by convert_trace.py if exists, or parse the json file.
+    '''
+    if os.path.isdir(filename):
+        return Event_table.load(filename + '/')
+    return Event_table.from_json(filename + '.json').sorted_by_time()
 
 def load_machine_data(filename: str) -> dict:
     '''Load machine_attributes.json from filename.'''
@@ -47,14 +62,14 @@ def createVM(machine_attributes: dict) -> dict:
     logging.info('Finished creating vm instance, store in vm_list that map from vm_id to vm instance.')
     return vm_list
 
-def get_hourly_statistic_data(hour_events: np.array) -> np.array:
+def get_hourly_statistic_data(hour_events: Event_table) -> np.array:
     '''
     Sum up average_cpu_usage, bw_up, bw_down of hour tasks as hourly statistic data.
     For N = number of events in the hour.
     
     Parameters
     ----------
-    hour_events : np.array, shape: (N, 10)
+    hour_events : Event_table, shape: (N, 10)
         Task-level hour data.
 
     Returns
@@ -68,23 +83,23 @@ def get_hourly_statistic_data(hour_events: np.array) -> np.array:
     # only get the income events for traffic statistic
     hour_events = hour_events[hour_events[:, Task_event_index.event_type.value] == Event_type.start]
 
-    hourly_statistic_data = [None for i in range(len(Task_type_index))]
-    for task_type, task_idx in Task_type_index.__members__.items():
+    hourly_statistic_data = np.zeros((len(Task_type_index), 3))
+    for task_idx in Task_type_index:
         # [average_cpu, bw_up, bw_down]
-        data = hour_events[(hour_events[:, task_type_idx] == task_type)][:, average_cpu_usage_idx:T_down_idx + 1]
-        data = np.zeros(3) if data.size == 0 else np.sum(data, axis=0)
-        hourly_statistic_data[task_idx.value] = data
-    return np.array(hourly_statistic_data, dtype=list)
+        data = hour_events[hour_events[:, task_type_idx] == task_idx.value, average_cpu_usage_idx:T_down_idx + 1]
+        if data.size != 0:
+            hourly_statistic_data[task_idx.value] = np.sum(data, axis=0)
+    return hourly_statistic_data
 
-def data_preprocessing(history_data: np.array) -> tuple[np.array, set]:
+def data_preprocessing(history_data: Trace_reader) -> tuple[np.array, set]:
     '''
     Transform task-level history data into hourly history data, and generate user list.
     For N = number of tasks, H = number of hours.
 
     Parameters
     ----------
-    history_data : np.array, shape: (N, 10)
-        Task-level history data.
+    history_data : Trace_reader
+        The reader of task-level history data sorted by event_time, binned into hours in one pass.
     system_time : int
         The discrete system time.
     
@@ -95,86 +110,107 @@ def data_preprocessing(history_data: np.array) -> tuple[np.array, set]:
     user_list : set
         All user appeared in history data.
     '''
-    # each row with hourly VoIP, IP_Video, FTP data
-    hourly_history_data = []
-    user_id_set = set()
-    minutes_range = (Global.system_time, Global.system_time + small_round_minutes)
-
-    start_time_idx = Task_event_index.event_time.value
-    user_id_idx = Task_event_index.user_id.value
-    while history_data[history_data[:, start_time_idx] > minutes_range[0]].size != 0:
-        # hourly mask that fit the minutes_range
-        hour_mask = (minutes_range[0] <= history_data[:, start_time_idx]) & (history_data[:, start_time_idx] < minutes_range[1])
-        hour_tasks = history_data[hour_mask]
-        # calculate hourly average_cpu_usage, bw_up, bw_down of different task from history data
-        hourly_statistic_data = get_hourly_statistic_data(hour_tasks)
-        hourly_history_data.append(hourly_statistic_data)
-        # user had appeared
-        user_id_set = user_id_set | set(history_data[hour_mask][:, user_id_idx])
-        # update minutes_range to next hour
-        minutes_range = (minutes_range[0] + small_round_minutes, minutes_range[1] + small_round_minutes)
+    start = Global.system_time
+    # the hours until the last event, the events at the start of the hour after the last hour are not counted
+    hour_num = 0
+    if history_data.has_events_after(start):
+        hour_num = -((start - int(history_data.event_time[-1])) // small_round_minutes)
+    hour_tasks = history_data.read_until(start + hour_num * small_round_minutes)
+    # the events before start are not in any hour
+    hour_tasks = hour_tasks[hour_tasks[:, Task_event_index.event_time.value] >= start]
+    # user had appeared
+    user_id_set = set(hour_tasks.user_categories[np.unique(hour_tasks[:, Task_event_index.user_id.value])].tolist())
+    # only get the income events for traffic statistic
+    hour_tasks = hour_tasks[hour_tasks[:, Task_event_index.event_type.value] == Event_type.start]
+    hours = (hour_tasks[:, Task_event_index.event_time.value] - start) // small_round_minutes
+    bins = hours * len(Task_type_index) + hour_tasks[:, Task_event_index.task_type.value]
+    # sum up average_cpu_usage, bw_up, bw_down of each hour and task type in one pass, in the order of events
+    data = hour_tasks[:, Task_event_index.average_cpu_usage.value:Task_event_index.T_down.value + 1]
+    hourly_history_data = np.stack([np.bincount(bins, weights=data[:, idx], minlength=hour_num * len(Task_type_index))
+                                    for idx in range(data.shape[1])], axis=-1).reshape(hour_num, len(Task_type_index), data.shape[1])
     logging.info('Finished data preprocessing, get hour_task_record as hourly history data and record user has appeared.')
-    return np.array(hourly_history_data, dtype=list), user_id_set
+    return hourly_history_data, user_id_set
 
-def generate_user_to_vm_data(location: str) -> dict:
-    '''Random generate the runtime data from user to vm when new user arrive.'''
+def generate_user_to_vm_data(location: str, size: int = None, keys: dict = None) -> dict:
+    '''
+    Random generate the runtime data from user to vm when new user arrive, as np.array of size pairs if size is given,
+    or as np.array of the pairs deterministically if keys (map from field to the uint64 keys of pairs) is given.
+    '''
+    keys = keys or {}
     if location == 'cloud':
         return {
-                    'bw_up':beta(beta_a, beta_b, beta_t, beta_d),
-                    'bw_down':beta(beta_a, beta_b, beta_t, beta_d),
-                    'delay':PT5(PT5_cloud_a, PT5_cloud_b, PT5_cloud_d)
+                    'bw_up':beta(beta_a, beta_b, beta_t, beta_d, size=size, keys=keys.get('bw_up')),
+                    'bw_down':beta(beta_a, beta_b, beta_t, beta_d, size=size, keys=keys.get('bw_down')),
+                    'delay':PT5(PT5_cloud_a, PT5_cloud_b, PT5_cloud_d, size=size, keys=keys.get('delay'))
                 }
     elif location == 'edge':
         return {
-                    'bw_up':beta(beta_a, beta_b, beta_t, beta_d) * 0.6,
-                    'bw_down':beta(beta_a, beta_b, beta_t, beta_d) * 0.6,
-                    'delay':PT5(PT5_edge_a, PT5_edge_b, PT5_edge_d)
+                    'bw_up':beta(beta_a, beta_b, beta_t, beta_d, size=size, keys=keys.get('bw_up')) * 0.6,
+                    'bw_down':beta(beta_a, beta_b, beta_t, beta_d, size=size, keys=keys.get('bw_down')) * 0.6,
+                    'delay':PT5(PT5_edge_a, PT5_edge_b, PT5_edge_d, size=size, keys=keys.get('delay'))
                 }
     else:
         raise ValueError(f'invalid value {location} of location')
 
 def update_user_to_vm(user_id_list: np.array) -> None:
     '''Build user to vm table.'''
-    for vm_id in vm_list:
-        vm = vm_list[vm_id]
-        for user_id in user_id_list:
-            vm.from_user.setdefault(user_id, generate_user_to_vm_data(vm.location))
-    logging.info('New user/users detected, finished updating vm_list.from_user.')
+    new_user_id = [user_id for user_id in dict.fromkeys(user_id_list) if not Link_table.has_user(user_id)]
+    if Link_table.is_lazy():
+        # the links are generated when they are read
+        Link_table.add_users(new_user_id)
+        logging.info('New user/users detected, finished updating user to vm link table.')
+        return
+    links = np.empty((len(new_user_id), len(vm_list), 3))
+    if user_to_vm_sequential_sampling:
+        for vm_id in vm_list:
+            position = Link_table.vm_position[vm_id]
+            for row in range(len(new_user_id)):
+                data = generate_user_to_vm_data(vm_list[vm_id].location)
+                links[row, position] = [data[field] for field in Link_table.fields]
+    else:
+        # the links to the vm of a location are generated in one batch, in the order of vm then user
+        positions = {}
+        for vm_id in vm_list:
+            positions.setdefault(vm_list[vm_id].location, []).append(Link_table.vm_position[vm_id])
+        for location, position in positions.items():
+            data = generate_user_to_vm_data(location, len(position) * len(new_user_id))
+            for idx, field in enumerate(Link_table.fields):
+                links[:, position, idx] = data[field].reshape(len(position), len(new_user_id)).T
+    Link_table.add_users(new_user_id, links)
+    logging.info('New user/users detected, finished updating user to vm link table.')
 
-def update_history_data(hourly_history_data: np.array, hour_task_record: np.array, statistic_data: np.array) -> tuple[np.array, np.array]:
+def update_history_data(hourly_history_data: History_buffer, hour_task_record: np.array, statistic_data: np.array) -> tuple[History_buffer, np.array]:
     '''Append hour_task_record into hourly_history_data, and update statistic_data by hour_task_record.'''
-    if hourly_history_data is None:
-        # the first time call this function (cannot use vstack when hourly_history_data is empty)
-        hourly_history_data = hour_task_record
-        statistic_data = np.mean(hour_task_record, axis=0)
-    else:
-        hourly_history_data = np.vstack([hourly_history_data, hour_task_record])
-    _message = f'add hour data:\n{np.mean(hour_task_record, axis=0)}\ninto statistic data:\n{statistic_data}\n'
+    hour_mean = np.mean(hour_task_record, axis=0)
+    if len(hourly_history_data) == 0:
+        # the first time call this function
+        statistic_data = hour_mean
+    hourly_history_data.append(hour_task_record)
+    _message = f'add hour data:\n{hour_mean}\ninto statistic data:\n{statistic_data}\n'
     # update statistic data with the influence of _phi
     if round % 7 == 1 or round % 7 == 6:
-        statistic_data = np.mean(hourly_history_data[-168:-145], axis=0)
+        statistic_data = np.mean(hourly_history_data.get(-168, -145), axis=0)
     else:
-        statistic_data = statistic_data * (1 - phi) + np.mean(hour_task_record, axis=0) * phi
+        statistic_data = statistic_data * (1 - phi) + hour_mean * phi
     logging.info(_message + f'statistic data becomes:\n{statistic_data}')
     return hourly_history_data, statistic_data
 
-def task_deployment(hour_events: np.array, minutes_range: tuple) -> None:
+def task_deployment(minutes_range: tuple) -> None:
     '''Random assign task to operator and deploy the task.'''
     # start hourly task deployment
     logging.info(f'mno deploy with best population {toSoftmax(mno._task_deployment.optimizing.best_population[:-2])} '
                     f'with fitness: {mno._task_deployment.optimizing.best_fitness}')
     logging.info(f'mvno deploy with best population {toSoftmax(mvno._task_deployment.optimizing.best_population[:-2])} '
                     f'with fitness: {mvno._task_deployment.optimizing.best_fitness}')
-    global task_events
-    idx = 0
-    while idx < len(hour_events):
-        event = hour_events[idx]
+    # the rescheduled tasks are pushed back to the queue and come out of the cursor again
+    for event in Task_handler.hour_cursor(minutes_range):
+        Instruments.count('events')
         Global.system_time = event[Task_event_index.event_time.value]
         user_id = event[Task_event_index.user_id.value]
         if event[Task_event_index.event_type.value] == Event_type.start:
             # get/assign the operator to the task
             operator = user_id_to_operator.setdefault(user_id, np.random.choice([mno, mvno], 1, p = [mno_rate, 1 - mno_rate])[0])
-            logging.info(f'task {event[Task_event_index.index.value]} assign to {operator.name}, task type: {event[Task_event_index.task_type.value]}')
+            task_logger.info(lazy_message(lambda: f'task {event[Task_event_index.index.value]} assign to {operator.name}, task type: {event[Task_event_index.task_type.value]}'))
             # generate the user to vm data if new user not in history data arrival
             if user_id not in user_id_set:
                 update_user_to_vm([user_id])
@@ -185,27 +221,24 @@ def task_deployment(hour_events: np.array, minutes_range: tuple) -> None:
             operator = user_id_to_operator[user_id]
             operator.release_task(event)
 
-        if Task_handler.changed:
-            task_events = Task_handler.task_events
-            event_time_idx = Task_event_index.event_time.value
-            hour_mask = (minutes_range[0] <= task_events[:, event_time_idx]) & (task_events[:, event_time_idx] < minutes_range[1])
-            hour_events = task_events[hour_mask]
-            Task_handler.changed = False
-        else:
-            idx += 1
-
 # load data
 with step_logger('Start of load data', title1, 'Finished loading data.'):
     machine_attributes = load_machine_data(test_data_dir + 'machine_attributes.json')
-    history_data = load_task_data(test_data_dir + 'history_data.json')
-    task_events = load_task_data(test_data_dir + 'task_events.json')
+    history_data = load_task_data(test_data_dir + 'history_data')
+    task_events = load_task_data(test_data_dir + 'task_events')
 
 # initialization
 with step_logger('Start of Initialization', title1, 'Finished initialization.'):
     Global.system_time = 0
     # create dict map from vm_id to VM instance
     vm_list = createVM(machine_attributes)
-    hour_task_record, user_id_set = data_preprocessing(history_data)
+    Link_table.load(list(vm_list.keys()), [vm.location for vm in vm_list.values()],
+                    generate_user_to_vm_data if lazy_user_to_vm else None)
+    if metrics_flush_hours is not None:
+        Metrics_store.open(f'Metrics/{case_num}metrics.npz')
+    if event_trace:
+        Event_trace.open(test_data_dir + 'event_trace.bin', list(vm_list.keys()), event_trace_buffer)
+    hour_task_record, user_id_set = data_preprocessing(Trace_reader(history_data))
     # sort the set to make simulation reproducible. (or will get different user_to_vm)
     user_id_list = np.array(sorted(user_id_set))
     # build user_to_vm
@@ -215,12 +248,14 @@ with step_logger('Start of Initialization', title1, 'Finished initialization.'):
     mno = MNO(mvno, list(vm_list.keys()), vm_list)
     # for keeping the mapping from user_id to the operator within task deployment
     user_id_to_operator = {}
-    # save the overall task events to process the unsatisfied tasks.
-    Task_handler.task_events = task_events
+    # queue the overall task events to process the unsatisfied tasks.
+    Task_handler.load(Trace_reader(task_events))
 
 # initialize
 statistic_data = np.zeros((3,3))
-hourly_history_data = None
+# the statistic data of weekend reads the hours a week ago
+assert(history_capacity >= 168)
+hourly_history_data = History_buffer(history_capacity)
 start_time = Global.system_time
 while Global.system_time // big_round_minutes < big_round_times:
     round = Global.system_time // big_round_minutes + 1
@@ -241,21 +276,17 @@ while Global.system_time // big_round_minutes < big_round_times:
                 temp_time = Global.system_time
                 # get the hour tasks data
                 minutes_range = (Global.system_time, Global.system_time + small_round_minutes)
-                event_time_idx = Task_event_index.event_time.value
-                hour_mask = (minutes_range[0] <= task_events[:, event_time_idx]) & (task_events[:, event_time_idx] < minutes_range[1])
-                hour_events = task_events[hour_mask]
+                hour_events = Task_handler.get_hour_events(minutes_range)
                 
-                with mno._task_deployment, mvno._task_deployment, step_logger(f'Start of hour {hour_num}\n'
-                    f'Get hour events: {len(hour_events)}\nid,type,time\n{hour_events}', 0, f'Finished hour {hour_num}'):
-                    if not hour_events.size == 0:
-                        task_deployment(hour_events, minutes_range)
-                task_events = Task_handler.task_events
-                Task_handler.changed = False
+                with mno._task_deployment, mvno._task_deployment, step_logger(lazy_message(lambda: f'Start of hour {hour_num}\n'
+                    f'Get hour events: {len(hour_events)}\nid,type,time\n{hour_events}'), 0, f'Finished hour {hour_num}', logger=task_logger.info):
+                    if len(hour_events) != 0:
+                        task_deployment(minutes_range)
 
                 # prepare for next round
                 Global.system_time = temp_time + small_round_minutes
-                logging.info(f'mno overall hour utility: {mno._task_deployment.hour_utility}, # of task: {mno._task_deployment.hour_task_num}, hour fitness: {mno._task_deployment.hour_fitness}')
-                logging.info(f'mvno overall hour utility: {mvno._task_deployment.hour_utility}, # of task: {mvno._task_deployment.hour_task_num}, hour fitness: {mvno._task_deployment.hour_fitness}')
+                task_logger.info(f'mno overall hour utility: {mno._task_deployment.hour_utility}, # of task: {mno._task_deployment.hour_task_num}, hour fitness: {mno._task_deployment.hour_fitness}')
+                task_logger.info(f'mvno overall hour utility: {mvno._task_deployment.hour_utility}, # of task: {mvno._task_deployment.hour_task_num}, hour fitness: {mvno._task_deployment.hour_fitness}')
 
                 # with step_logger(f'Start of Updating Parameters', title3, 'Finished updating MNO and MVNO parameters.'):
                 #     mno.update_task_deployment_parameters()
@@ -264,11 +295,18 @@ while Global.system_time // big_round_minutes < big_round_times:
                 hourly_statistic_data = get_hourly_statistic_data(hour_events)
                 hour_task_record.append(hourly_statistic_data)
                 Metrics.hour_data.append(hourly_statistic_data)
+                Instruments.snapshot('hour', hour_num)
+                if metrics_flush_hours is not None and hour_num % metrics_flush_hours == 0:
+                    Metrics.flush()
         Metrics.mno_vm_utilization.append(len(mno._task_deployment.vm_used) / len(mno.hold_vm_id))
         Metrics.mvno_vm_utilization.append(len(mvno._task_deployment.vm_used) / len(mvno.hold_vm_id))
-        hour_task_record = np.array(hour_task_record, dtype=list)
+        Instruments.snapshot('round', round)
+        hour_task_record = np.array(hour_task_record)
         start_time = Global.system_time
         assert(Global.system_time % big_round_minutes == 0)
+Event_trace.close()
+Instruments.snapshot('run', 'total')
+Instruments.export(test_data_dir + 'instruments')
 logging.info(f'Finished simulating, save log to {test_data_dir}log_{lev}.txt')
 print(f'Finished simulating, save log to {test_data_dir}log_{lev}.txt!')
 Metrics.plot()
\ No newline at end of file
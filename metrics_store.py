@@ -0,0 +1,97 @@
+import os
+import time
+import zipfile
+import numpy as np
+
+class Metrics_store:
+    '''
+    Single .npz container of the metrics of a run, each flush appends the new rows of each metric as the chunk
+    member name/chunk.npy, so the rows are written once and the container is readable while the run is in progress.
+    '''
+    # None when the metrics are only kept in memory
+    filename = None
+    # map from metric name to the number of chunks written
+    chunks = {}
+
+    @classmethod
+    def open(cls, filename: str) -> None:
+        '''Start a new container at filename.'''
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        zipfile.ZipFile(filename, 'w').close()
+        cls.filename = filename
+        cls.chunks = {}
+
+    @classmethod
+    def is_open(cls) -> bool:
+        return cls.filename is not None
+
+    @classmethod
+    def write(cls, metrics: dict) -> None:
+        '''Append the rows of each metric as a new chunk.'''
+        with zipfile.ZipFile(cls.filename, 'a') as container:
+            for name, rows in metrics.items():
+                chunk = cls.chunks.get(name, 0)
+                with container.open(f'{name}/{chunk:06d}.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(rows))
+                cls.chunks[name] = chunk + 1
+
+    @staticmethod
+    def read(filename: str, name: str = None, retry: int = 3):
+        '''
+        Read the chunks of metric name concatenated, or a dict of all metrics if name is None.
+        The container being flushed by the run at the same time is read again after a while.
+        '''
+        for attempt in range(retry + 1):
+            try:
+                with zipfile.ZipFile(filename, 'r') as container:
+                    chunks = {}
+                    for member in sorted(container.namelist()):
+                        metric = member.rsplit('/', 1)[0]
+                        if name is None or metric == name:
+                            with container.open(member) as f:
+                                chunks.setdefault(metric, []).append(np.lib.format.read_array(f))
+                break
+            except zipfile.BadZipFile:
+                if attempt == retry:
+                    raise
+                time.sleep(0.1)
+        metrics = {metric: np.concatenate(rows) for metric, rows in chunks.items()}
+        return metrics if name is None else metrics.get(name)
+
+class Metric_array:
+    '''
+    Rows of a metric appended into a preallocated typed array, doubled when full.
+    The rows flushed into Metrics_store are dropped from memory, np.array(metric) reads them back.
+    '''
+    def __init__(self, name: str, shape: tuple = (), dtype=np.float64, capacity: int = 64):
+        self.name = name
+        self.data = np.empty((capacity,) + shape, dtype=dtype)
+        # the rows in memory and the rows flushed
+        self.size = 0
+        self.flushed = 0
+
+    def __len__(self) -> int:
+        return self.flushed + self.size
+
+    def append(self, value) -> None:
+        if self.size == len(self.data):
+            data = np.empty((2 * len(self.data),) + self.data.shape[1:], dtype=self.data.dtype)
+            data[:self.size] = self.data
+            self.data = data
+        self.data[self.size] = value
+        self.size += 1
+
+    def pop_rows(self) -> np.array:
+        '''Take the rows in memory out to flush.'''
+        rows = self.data[:self.size].copy()
+        self.flushed += self.size
+        self.size = 0
+        return rows
+
+    def __array__(self, dtype=None, copy=None) -> np.array:
+        rows = self.data[:self.size]
+        if self.flushed != 0:
+            rows = np.concatenate((Metrics_store.read(Metrics_store.filename, self.name), rows))
+        return rows if dtype is None else rows.astype(dtype)
@@ -3,6 +3,7 @@ import numpy as np
 from vm_assignment import VMAssignment
 from task_deployment import TaskDeployment
 from contract import Contract
+from link_table import Link_table
 from utils import (step_logger, get_total_resource, timer, Metrics)
 from parameters import (_mu, title4, mno_op_bw, mno_op_cr, mvno_op_bw, mvno_op_cr, expected_task_num, Task_type_index, case_num, _theta)
 import logging
@@ -10,13 +11,21 @@ import logging
 class Network_operator(abc.ABC):
     def __init__(self):
         self.hold_vm_id = None
+        # the hold vm id of each task type, in the order of hold_vm_id
+        self.hold_vm_id_by_type = None
         self._task_deployment = TaskDeployment(self.name, self.op_bw, self.op_cr)
 
-    def deploy_task(self, task: np.array, vm_list: dict) -> None:
+    def deploy_task(self, task: list, vm_list: dict) -> None:
         '''Delegate to class TaskDeployment.'''
-        self._task_deployment.deploy(self.hold_vm_id, task, vm_list)
+        self._task_deployment.deploy(self.hold_vm_id_by_type, task, vm_list)
 
-    def release_task(self, task: np.array) -> None:
+    def set_hold_vm_id(self, hold_vm_id: np.array, vm_list: dict) -> None:
+        '''Set the vm hold by operator and index them by task type.'''
+        self.hold_vm_id = hold_vm_id
+        task_types = np.array([Task_type_index[vm_list[vm_id].task_type].value for vm_id in hold_vm_id], dtype=int)
+        self.hold_vm_id_by_type = [hold_vm_id[task_types == task_type.value] for task_type in Task_type_index]
+
+    def release_task(self, task: list) -> None:
         '''Delegate to class TaskDeployment.'''
         self._task_deployment.release(task)
 
@@ -50,17 +59,16 @@ class MNO(Network_operator):
         '''Calculate average vm bw and delegate to class VMAssignment.'''
         def get_avg_vm_bw():
             '''Calculate the average bw from all user to vm.'''
-            for vm in vm_list.values():
-                bw_up_sum = 0
-                bw_down_sum = 0
-                for data in vm.from_user.values():
-                    bw_up_sum += data['bw_up']
-                    bw_down_sum += data['bw_down']
-                vm.avg_bw_up = bw_up_sum / len(vm.from_user)
-                vm.avg_bw_down = bw_down_sum / len(vm.from_user)
+            avg_bw_up, avg_bw_down = Link_table.get_avg_bw()
+            for vm_id, vm in vm_list.items():
+                position = Link_table.vm_position[vm_id]
+                vm.avg_bw_up = float(avg_bw_up[position])
+                vm.avg_bw_down = float(avg_bw_down[position])
         get_avg_vm_bw()
         self._vm_assignment = VMAssignment(self.contract, self.total_vm_id, vm_list)
-        self.hold_vm_id, self.mvno.hold_vm_id = self._vm_assignment.run(statistic_data)
+        hold_vm_id, mvno_hold_vm_id = self._vm_assignment.run(statistic_data)
+        self.set_hold_vm_id(hold_vm_id, vm_list)
+        self.mvno.set_hold_vm_id(mvno_hold_vm_id, vm_list)
         # MNO
         mno_resource, edge_num, cloud_num = get_total_resource(self.hold_vm_id, vm_list)
         logging.info(f'mno vm id: {self.hold_vm_id},\ntotal resource (cr, bw_up, bw_down): {mno_resource},\n'
@@ -1,10 +1,13 @@
 import abc
 import numpy as np
 import math
+from scipy.optimize import (milp, LinearConstraint, Bounds)
 from contract import Contract
-from utils import (toSoftmax, get_TD_populations_log_msg)
+from utils import (toSoftmax, get_TD_populations_log_msg, lazy_message)
+from ga_operators import (two_point_crossover, flip_mutation, scale_mutation)
+from instruments import Instruments
 from parameters import (offspring_number, Task_type_index, _theta, _lambda, mutate_rate, rnd_seed,
-                        _gamma, max_searching_times, mno_rate)
+                        _gamma, mno_rate, ga_seed_compatible)
 import logging
 
 np.random.seed(rnd_seed)
@@ -27,6 +30,18 @@ class GeneticOptimizing(abc.ABC):
     def mutation(self):
         pass
 
+    @staticmethod
+    def SUS(populations: np.array, fitness: list) -> np.array:
+        '''
+        Stochastic universal sampling on the wheel with ceil(fitness) slots of each population.
+        The wheel is not built, the population of a slot is found on the cumulative slots by searchsorted.
+        '''
+        N = offspring_number
+        P = int(sum(fitness) // N)
+        Start = np.random.randint(0, P)
+        slots = np.cumsum([math.ceil(max(0, value)) for value in fitness])
+        return populations[np.searchsorted(slots, Start + np.arange(N) * P, side='right')]
+
 class VMAssignmentOptimizing(GeneticOptimizing):
 
     def __init__(self, contract: Contract, candidate_vm_id: np.array, vm_list: dict):
@@ -40,6 +55,27 @@ class VMAssignmentOptimizing(GeneticOptimizing):
         self.best_fitness = 0
         self.min_population_len = None
         self.valid_evolution_message = None
+        self.debug = False
+        # the number of vm sets checked, counted here too for the islands evolved in the worker processes
+        self.condition_checks = 0
+        # resource (bw_up, bw_down, cr), task type index and price of each candidate vm
+        vms = [vm_list[vm_id] for vm_id in candidate_vm_id]
+        self.resources = np.array([[vm.avg_bw_up, vm.avg_bw_down, vm.cr] for vm in vms], dtype=float).reshape(-1, 3)
+        self.vm_task_type = np.array([Task_type_index[vm.task_type].value for vm in vms], dtype=int)
+        self.prices = np.array([vm.origin_price for vm in vms], dtype=float)
+        # resource of each candidate vm under its task type, shape: (vm, task type * (bw_up, bw_down, cr))
+        task_type_one_hot = np.zeros((len(vms), len(Task_type_index)))
+        task_type_one_hot[np.arange(len(vms)), self.vm_task_type] = 1
+        self.type_resources = (task_type_one_hot[:, :, None] * self.resources[:, None, :]).reshape(len(vms), -1)
+
+    def get_diversity(self) -> float:
+        '''Mean hamming distance between each pair of populations over the number of vm, 0 if all populations are the same.'''
+        populations, vm_num = len(self.new_populations), len(self.candidate_vm_id)
+        if populations < 2 or vm_num == 0:
+            return 0.
+        # each vm chosen by count populations differs between count * (populations - count) pairs
+        count = np.sum(self.new_populations, axis=0)
+        return float(np.sum(count * (populations - count)) / (populations * (populations - 1) / 2 * vm_num))
 
     def step(self, statistic_data: np.array) -> np.array:
         '''Get the next valid offsprings.'''
@@ -49,148 +85,212 @@ class VMAssignmentOptimizing(GeneticOptimizing):
             self.min_population_len = min(len(population) for population in self.new_populations)
             return self.new_populations
         else:
+            self.valid_evolution_message = ''
+            # the message of evolution is only built for the debug log
+            self.debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+            parents = self.selection()
+            # the crossover is in place, the parents are kept for the offsprings failed to repair
+            offsprings = self.crossover(parents.copy())
+            offsprings = self.mutation(offsprings)
             # to ensure all offsprings fit the conditions
-            flag = False
-            cnt = 0
-            while not flag:
-                if cnt > max_searching_times:
-                    logging.warning('Cannot find valid vm assignment, regenerate initial populations.')
-                    raise ValueError('Improper parameters setting cause no legal vm assignment.')
-                cnt += 1
-                # print overall message only if all offsprings fit the conditions
-                self.valid_evolution_message = ''
-                parents = self.selection()
-                offsprings = self.crossover(parents)
-                offsprings = self.mutation(offsprings)
-                flag = True
-                for offspring in offsprings:
-                    if not self.check_condition(offspring, statistic_data):
-                        flag = False
+            for idx in np.flatnonzero(~self.check_conditions(offsprings, statistic_data)):
+                try:
+                    offsprings[idx] = self.repair(offsprings[idx], statistic_data)
+                except ValueError:
+                    # keep the parent fit the conditions, or the best population, instead of failing the generation
+                    if self.check_condition(parents[idx], statistic_data):
+                        offsprings[idx] = parents[idx]
+                    elif self.best_population is not None:
+                        offsprings[idx] = self.best_population
+                    else:
+                        raise
+                if self.debug:
+                    self.valid_evolution_message += f'offspring {idx + 1} repaired to:\n{offsprings[idx]}\n'
             logging.debug(self.valid_evolution_message)
             self.new_populations = offsprings
             return offsprings
 
     def choose_vm(self, candidate_vm_id: np.array, statistic_data: np.array) -> np.array:
-        '''Random choose a set of vm that fit the condition.'''
-        try_count = 0
-        selected_vm = np.zeros(candidate_vm_id.shape, dtype=bool)
-        while not self.check_condition(selected_vm, statistic_data):
-            ratio = np.random.random()
-            selected_vm = np.random.choice([True, False], candidate_vm_id.shape, p=[(1 - mno_rate) * ratio, 1 - (1 - mno_rate) * ratio])
-            try_count += 1
-            if try_count == 1000:
-                raise ValueError('vm assignment can\'t find solution.')
+        '''Random choose a set of vm and repair it to fit the condition, the best population instead if it cannot be repaired.'''
+        ratio = np.random.random()
+        selected_vm = np.random.choice([True, False], candidate_vm_id.shape, p=[(1 - mno_rate) * ratio, 1 - (1 - mno_rate) * ratio])
+        if self.check_condition(selected_vm, statistic_data):
+            return selected_vm
+        try:
+            return self.repair(selected_vm, statistic_data)
+        except ValueError:
+            if self.best_population is None:
+                raise
+            return self.best_population.copy()
+
+    def repair(self, selected_vm: np.array, statistic_data: np.array) -> np.array:
+        '''
+        Repair the vm set to fit the conditions by greedy_repair, if it gets stuck, repair from the empty vm set
+        by the resource only instead of the price, and if both get stuck, by exact_repair.
+        Raise ValueError only if no vm set fits the conditions.
+        '''
+        try:
+            return self.greedy_repair(selected_vm, statistic_data, by_price=True)
+        except ValueError:
+            pass
+        try:
+            return self.greedy_repair(np.zeros_like(selected_vm), statistic_data, by_price=False)
+        except ValueError:
+            return self.exact_repair(selected_vm, statistic_data)
+
+    def get_linear_conditions(self, statistic_data: np.array) -> tuple[np.array, np.array, np.array]:
+        '''
+        The conditions as lb <= A @ selected_vm <= ub, the rows of A are the resource of each task type and the
+        sum of (bw_up, bw_down, cr), for the demand of each task type and the bounds of contract.
+        '''
+        need = (statistic_data[:, [1, 2, 0]] * _theta).reshape(-1)
+        low = np.array([self.contract.bw_low, self.contract.bw_low, self.contract.cr_low])
+        high = np.array([self.contract.bw_high, self.contract.bw_high, self.contract.cr_high])
+        A = np.vstack((self.type_resources.T, self.resources.T))
+        return A, np.concatenate((need, low)), np.concatenate((np.full(len(need), np.inf), high))
+
+    def exact_repair(self, selected_vm: np.array, statistic_data: np.array) -> np.array:
+        '''
+        Get the vm set fit the conditions with the fewest vm changed from selected_vm by 0/1 integer program,
+        raise ValueError if no vm set fits the conditions.
+        '''
+        A, lb, ub = self.get_linear_conditions(statistic_data)
+        # the number of vm changed, x of the vm not selected and 1 - x of the vm selected
+        changes = np.where(selected_vm, -1., 1.)
+        # the bounds are first narrowed by the tolerance of solver, so the vm set found fits the exact conditions
+        for tolerance in (1e-6, 0):
+            margin = lambda bound: tolerance * np.maximum(1, np.abs(np.where(np.isfinite(bound), bound, 0)))
+            constraints = LinearConstraint(A, lb + margin(lb), ub - margin(ub))
+            result = milp(changes, constraints=constraints, integrality=np.ones(len(changes)), bounds=Bounds(0, 1))
+            if result.x is not None and self.check_condition(result.x > 0.5, statistic_data):
+                return result.x > 0.5
+        raise ValueError('Improper parameters setting cause no legal vm assignment.')
+
+    def greedy_repair(self, selected_vm: np.array, statistic_data: np.array, by_price: bool) -> np.array:
+        '''
+        Greedily repair the vm set to fit the conditions, one vm is added or removed at each step:
+        1. remove the vm covering the most exceeding resource until the upper bounds of contract hold.
+        2. add the vm covering the most lacking resource until the demand of each task type and the lower bounds of
+           contract hold, relative to its price if by_price and the part of remaining room below the upper bounds it takes.
+        3. remove the vm as 1. but only the vm keeping the demand and the lower bounds, until the upper bounds hold.
+        Each step of a phase adds a vm not selected or removes a vm selected, or raises ValueError when no vm can,
+        so each phase ends within the number of vm steps. It may get stuck on the conditions only a few vm sets fit.
+        '''
+        selected_vm = selected_vm.copy()
+        # the demand of each task type and the bounds of contract, in (bw_up, bw_down, cr)
+        need = statistic_data[:, [1, 2, 0]] * _theta
+        low = np.array([self.contract.bw_low, self.contract.bw_low, self.contract.cr_low])
+        high = np.array([self.contract.bw_high, self.contract.bw_high, self.contract.cr_high])
+
+        def remove(keep: bool) -> None:
+            while True:
+                resource = self.get_type_resources(selected_vm)[0]
+                total = resource.sum(axis=0)
+                excess = np.maximum(total - high, 0)
+                if not np.any(excess > 0):
+                    return
+                candidates = np.flatnonzero(selected_vm)
+                removed = self.resources[candidates]
+                if keep:
+                    task_idx = self.vm_task_type[candidates]
+                    removable = np.all(resource[task_idx] - removed >= need[task_idx], axis=1) & np.all(total - removed >= low, axis=1)
+                    candidates, removed = candidates[removable], removed[removable]
+                if candidates.size == 0:
+                    raise ValueError('Improper parameters setting cause no legal vm assignment.')
+                cover = np.sum(np.minimum(removed, excess) / np.where(excess > 0, excess, 1), axis=1)
+                # removing the vm covering no exceeding resource never helps
+                covering = cover > 0
+                if not np.any(covering):
+                    raise ValueError('Improper parameters setting cause no legal vm assignment.')
+                candidates, cover = candidates[covering], cover[covering]
+                selected_vm[candidates[np.argmax(cover * self.prices[candidates])]] = False
+
+        def add(candidates: np.array, lack: np.array) -> None:
+            # only the vm covering some lacking resource, e.g. not the vm without cpu for lacking cr
+            cover = np.sum(np.minimum(self.resources[candidates], lack) / np.where(lack > 0, lack, 1), axis=1)
+            candidates, cover = candidates[cover > 0], cover[cover > 0]
+            if candidates.size == 0:
+                raise ValueError('Improper parameters setting cause no legal vm assignment.')
+            total = self.get_type_resources(selected_vm)[0].sum(axis=0)
+            fit = np.all(total + self.resources[candidates] <= high, axis=1)
+            if np.any(fit):
+                candidates, cover = candidates[fit], cover[fit]
+            # the largest part of the remaining room below the upper bounds taken by the vm
+            usage = np.max(self.resources[candidates] / np.maximum(high - total, 1e-9), axis=1)
+            prices = self.prices[candidates]
+            if by_price and np.any(prices == 0):
+                # the free vm go first, ranked without price
+                candidates, cover, usage = candidates[prices == 0], cover[prices == 0], usage[prices == 0]
+                score = cover / (1 + usage)
+            elif by_price:
+                score = np.divide(cover, prices * (1 + usage), out=np.zeros_like(cover), where=prices > 0)
+            else:
+                score = cover / np.maximum(usage, 1e-9)
+            selected_vm[candidates[np.argmax(score)]] = True
+
+        remove(keep=False)
+        for task_idx in range(len(Task_type_index)):
+            while True:
+                lack = np.maximum(need[task_idx] - self.get_type_resources(selected_vm)[0, task_idx], 0)
+                if not np.any(lack > 0):
+                    break
+                add(np.flatnonzero((self.vm_task_type == task_idx) & ~selected_vm), lack)
+        while True:
+            lack = np.maximum(low - self.get_type_resources(selected_vm)[0].sum(axis=0), 0)
+            if not np.any(lack > 0):
+                break
+            add(np.flatnonzero(~selected_vm), lack)
+        remove(keep=True)
+        if not self.check_condition(selected_vm, statistic_data):
+            raise ValueError('Improper parameters setting cause no legal vm assignment.')
         return selected_vm
-    
+
     def selection(self) -> np.array:
         '''Stochastic universal sampling.'''
-        def SUS(Population: np.array):
-            F = sum(self.fitness)
-            N = offspring_number
-            P = int(F // N)
-            Start = np.random.randint(0, P)
-            return np.array([Population[Start + i * P] for i in range(N)])
-        wheels = []
-        for fitness, population in zip(self.fitness, self.new_populations):
-            wheel = np.full((math.ceil(fitness), *population.shape), population)
-            wheels.append(wheel)
-        wheel = np.vstack(wheels)
-        wheel = wheel.reshape((-1, *self.new_populations[0].shape))
-        parents = SUS(wheel)
-        self.valid_evolution_message += f'selected parents:\n{parents}\n'
+        parents = self.SUS(self.new_populations, self.fitness)
+        if self.debug:
+            self.valid_evolution_message += f'selected parents:\n{parents}\n'
         return parents
 
     def crossover(self, parents: np.array) -> np.array:
         '''Two-points crossover'''
-        points = [np.random.randint(0, self.min_population_len) for _ in range(2)]
-        left, right = min(points), max(points)
-        self.valid_evolution_message += f'selected points: ({left}, {right})\n'
-        selected_gene = np.zeros((offspring_number, right - left + 1))
-        for idx, parent in enumerate(parents):
-            selected_gene[idx] = parent[left:right + 1]
-        randomize = np.arange(len(selected_gene))
-        np.random.shuffle(randomize)
-        self.valid_evolution_message += f'order after shuffle: {randomize}, '
-        selected_gene = selected_gene[randomize]
-        parents[:, left:right + 1] = selected_gene
-        self.valid_evolution_message += f'new offsprings after crossover:\n{parents}\n'
+        parents, left, right, order = two_point_crossover(parents, self.min_population_len)
+        if self.debug:
+            self.valid_evolution_message += f'selected points: ({left}, {right})\n'
+            self.valid_evolution_message += f'order after shuffle: {order}, '
+            self.valid_evolution_message += f'new offsprings after crossover:\n{parents}\n'
         return parents
 
     def mutation(self, offsprings: np.array) -> np.array:
-        for i in range(len(offsprings)):
-            if np.random.random() < mutate_rate:
-                offsprings[i] = self.choose_vm(self.candidate_vm_id, self.statistic_data)
-            else:
-                mutate = np.random.choice([True, False], offsprings[i].shape, p=[mutate_rate, 1 - mutate_rate])
-                self.valid_evolution_message += f'offspring {i + 1} mutate at {np.arange(*offsprings[i].shape)[mutate]} bit\n'
-                for j in range(len(offsprings[i])):
-                    if mutate[j]:
-                        offsprings[i, j] = np.logical_not(offsprings[i, j])
-        self.valid_evolution_message += f'new offsprings:\n{offsprings}\n'
+        offsprings, regenerated, mask = flip_mutation(offsprings, mutate_rate,
+            lambda: self.choose_vm(self.candidate_vm_id, self.statistic_data), ga_seed_compatible)
+        if self.debug:
+            for i in np.flatnonzero(~regenerated):
+                self.valid_evolution_message += f'offspring {i + 1} mutate at {np.flatnonzero(mask[i])} bit\n'
+            self.valid_evolution_message += f'new offsprings:\n{offsprings}\n'
         return offsprings
 
+    def get_type_resources(self, populations: np.array) -> np.array:
+        '''Get the vm bw and cr data of different task type, shape: (population, task type, (bw_up, bw_down, cr)).'''
+        populations = np.reshape(populations, (-1, len(self.type_resources)))
+        return (populations.astype(float) @ self.type_resources).reshape(len(populations), len(Task_type_index), 3)
+
     def check_condition(self, selected_vm: np.array, statistic_data: np.array) -> bool:
         '''Check whether the vm set assign to mvno fit the conditions.'''
-        # get needed value
-        ## contract content
-        bw_low = self.contract.bw_low
-        bw_high = self.contract.bw_high
-        cr_low = self.contract.cr_low
-        cr_high = self.contract.cr_high
-
-        ## statistic data
-        voip_idx = Task_type_index.VoIP.value
-        cr_voip = statistic_data[voip_idx][0]
-        T_voip_up = statistic_data[voip_idx][1]
-        T_voip_down = statistic_data[voip_idx][2]
-        ipVideo_idx = Task_type_index.IP_Video.value
-        cr_ipVideo = statistic_data[ipVideo_idx][0]
-        T_ipVideo_up = statistic_data[ipVideo_idx][1]
-        T_ipVideo_down = statistic_data[ipVideo_idx][2]
-        ftp_idx = Task_type_index.FTP.value
-        cr_ftp = statistic_data[ftp_idx][0]
-        T_ftp_up = statistic_data[ftp_idx][1]
-        T_ftp_down = statistic_data[ftp_idx][2]
-
-        ## vm bw and cr data of different task type
-        bw_up_task_x = [0 for _ in range(len(Task_type_index))]
-        bw_down_task_x = [0 for _ in range(len(Task_type_index))]
-        cr_task_x = [0 for _ in range(len(Task_type_index))]
-        for id in self.candidate_vm_id[selected_vm]:
-            vm = self.vm_list[id]
-            task_idx = Task_type_index[vm.task_type].value
-            bw_up_task_x[task_idx] += vm.avg_bw_up
-            bw_down_task_x[task_idx] += vm.avg_bw_down
-            cr_task_x[task_idx] += vm.cr
-        bw_up_sum = sum(bw_up_task_x)
-        bw_down_sum = sum(bw_down_task_x)
-
-        # check condition
-        bw_up_voip_cond = bw_up_task_x[voip_idx] >= T_voip_up * _theta
-        bw_up_ipVideo_cond = bw_up_task_x[ipVideo_idx] >= T_ipVideo_up * _theta
-        bw_up_ftp_cond = bw_up_task_x[ftp_idx] >= T_ftp_up * _theta
-        bw_down_voip_cond = bw_down_task_x[voip_idx] >= T_voip_down * _theta
-        bw_down_ipVideo_cond = bw_down_task_x[ipVideo_idx] >= T_ipVideo_down * _theta
-        bw_down_ftp_cond = bw_down_task_x[ftp_idx] >= T_ftp_down * _theta
-        cr_voip_cond = cr_task_x[voip_idx] >= cr_voip * _theta
-        cr_ipVideo_cond = cr_task_x[ipVideo_idx] >= cr_ipVideo * _theta
-        cr_ftp_cond = cr_task_x[ftp_idx] >= cr_ftp * _theta
-        bw_low_cond = bw_low <= min(bw_up_sum, bw_down_sum)
-        bw_high_cond = max(bw_up_sum, bw_down_sum) <= bw_high
-        cr_cond = cr_low <= sum(cr_task_x) <= cr_high
-
-        return bw_up_voip_cond and\
-            bw_up_ipVideo_cond and\
-            bw_up_ftp_cond and\
-            bw_down_voip_cond and\
-            bw_down_ipVideo_cond and\
-            bw_down_ftp_cond and\
-            cr_voip_cond and\
-            cr_ipVideo_cond and\
-            cr_ftp_cond and\
-            bw_low_cond and\
-            bw_high_cond and\
-            cr_cond
+        return bool(self.check_conditions(selected_vm[None], statistic_data)[0])
+
+    def check_conditions(self, populations: np.array, statistic_data: np.array) -> np.array:
+        '''Check whether each vm set (row of populations) assign to mvno fit the conditions at once.'''
+        Instruments.count('check_condition', len(populations))
+        self.condition_checks += len(populations)
+        resource = self.get_type_resources(populations)
+        # statistic data of each task type is (cr, T_up, T_down)
+        task_cond = np.all(resource >= statistic_data[:, [1, 2, 0]] * _theta, axis=(1, 2))
+        bw_up_sum, bw_down_sum, cr_sum = resource.sum(axis=1).T
+        bw_low_cond = self.contract.bw_low <= np.minimum(bw_up_sum, bw_down_sum)
+        bw_high_cond = np.maximum(bw_up_sum, bw_down_sum) <= self.contract.bw_high
+        cr_cond = (self.contract.cr_low <= cr_sum) & (cr_sum <= self.contract.cr_high)
+        return task_cond & bw_low_cond & bw_high_cond & cr_cond
 
 class TaskDeploymentParametersOptimizing(GeneticOptimizing):
 
@@ -201,6 +301,7 @@ class TaskDeploymentParametersOptimizing(GeneticOptimizing):
 
         # Save the populations without softmax
         self.new_populations = np.array([self.initialize_population() for _ in range(offspring_number)])
+        self.update_offspring_parameters()
         self.fitness = [0 for _ in range(offspring_number)]
         self.best_population = np.concatenate((self.best_gamma.flatten(), [self.best_op_bw, self.best_op_cr]))
         self.best_fitness = float('-inf')
@@ -211,11 +312,18 @@ class TaskDeploymentParametersOptimizing(GeneticOptimizing):
         new_op_cr = np.random.uniform(0, 0.4, 1)
         return np.concatenate((new_gamma, new_op_bw, new_op_cr))
 
+    def update_offspring_parameters(self) -> None:
+        '''Cache the softmax gamma and operating values of new_populations, which only change in step.'''
+        populations = np.array([toSoftmax(population) for population in self.new_populations])
+        # gamma matrix of each task type, shape: (offspring, gamma)
+        self.offspring_gamma = [populations[:, 0:6], populations[:, 6:12], populations[:, 12:18]]
+        self.offspring_op_bw, self.offspring_op_cr = populations[:, -2], populations[:, -1]
+
     def update_best_population(self) -> None:
         # update best population
         flag = True
         for idx, (fitness, population) in enumerate(zip(self.fitness, self.new_populations)):
-            logging.debug(f'population {idx + 1} {toSoftmax(population)[:-2]} with fitness: {fitness}')
+            logging.debug(lazy_message(lambda: f'population {idx + 1} {toSoftmax(population)[:-2]} with fitness: {fitness}'))
             if fitness > self.best_fitness:
                 flag = False
                 logging.info(f'better population {idx + 1} found, update best population!')
@@ -234,54 +342,27 @@ class TaskDeploymentParametersOptimizing(GeneticOptimizing):
         parents = self.selection()
         offsprings = self.crossover(parents)
         self.new_populations = self.mutation(offsprings)
+        self.update_offspring_parameters()
         self.fitness = [0 for _ in range(offspring_number)]
 
     def selection(self) -> np.array:
         '''Stochastic universal sampling.'''
-        def SUS(Population: np.array):
-            F = sum(self.fitness)
-            N = offspring_number
-            P = int(F // N)
-            Start = np.random.randint(0, P)
-            return np.array([Population[Start + i * P] for i in range(N)])
-        wheels = []
-        for fitness, population in zip(self.fitness, self.new_populations):
-            wheel = np.full((math.ceil(max(0, fitness)), *population.shape), population)
-            wheels.append(wheel)
-        wheel = np.vstack(wheels)
-        wheel = wheel.reshape((-1, *self.new_populations[0].shape))
-        parents = SUS(wheel)
-        logging.debug(get_TD_populations_log_msg('selected parents', parents))
+        parents = self.SUS(self.new_populations, self.fitness)
+        logging.debug(lazy_message(lambda: get_TD_populations_log_msg('selected parents', parents)))
         return parents
 
     def crossover(self, parents) -> np.array:
         '''Two-points crossover'''
-        points = [np.random.randint(0, len(parents[0])) for _ in range(2)]
-        left, right = min(points), max(points)
+        parents, left, right, order = two_point_crossover(parents, len(parents[0]))
         logging.debug(f'selected points: ({left}, {right})')
-        selected_gene = np.zeros((offspring_number, right - left + 1))
-        for idx, parent in enumerate(parents):
-            selected_gene[idx] = parent[left:right + 1]
-        randomize = np.arange(len(selected_gene))
-        np.random.shuffle(randomize)
-        logging.debug(f'order after shuffle: {randomize}')
-        selected_gene = selected_gene[randomize]
-        parents[:, left:right + 1] = selected_gene
-        logging.debug(get_TD_populations_log_msg('new offsprings after crossover', parents))
+        logging.debug(f'order after shuffle: {order}')
+        logging.debug(lazy_message(lambda: get_TD_populations_log_msg('new offsprings after crossover', parents)))
         return parents
 
     def mutation(self, offsprings) -> np.array:
+        offsprings, mask, scale = scale_mutation(offsprings, mutate_rate, (1.2, 0.8), ga_seed_compatible)
         for i in range(len(offsprings)):
-            mutate = np.random.choice([True, False], offsprings[i].shape, p=[mutate_rate, 1 - mutate_rate])
-            _message = f'offspring {i + 1} mutate at {np.arange(*offsprings[i].shape)[mutate]} bit, multiply by'
-            for j in range(len(offsprings[i])):
-                if mutate[j]:
-                    if np.random.random() < 0.5:
-                        _message += f' 1.2'
-                        offsprings[i, j] = offsprings[i, j] * 1.2
-                    else:
-                        _message += f' 0.8'
-                        offsprings[i, j] = offsprings[i, j] * 0.8
-            logging.debug(_message)
-        logging.debug(get_TD_populations_log_msg('new offsprings after mutation', offsprings))
-        return offsprings
\ No newline at end of file
+            logging.debug(lazy_message(lambda: f'offspring {i + 1} mutate at {np.flatnonzero(mask[i])} bit, multiply by'
+                + ''.join(f' {factor}' for factor in scale[i, mask[i]].tolist())))
+        logging.debug(lazy_message(lambda: get_TD_populations_log_msg('new offsprings after mutation', offsprings)))
+        return offsprings
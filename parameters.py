@@ -6,6 +6,17 @@ class Global:
 
 rnd_seed = 1125
 logging_level = logging.INFO
+## quiet mode: drop the per task and per hour log of task deployment
+quiet_logging = False
+## write the deploy, block, reschedule, bind and release decisions of tasks as binary trace into test_data_dir + 'event_trace.bin',
+## read it by event_trace.Event_trace_reader
+event_trace = False
+event_trace_buffer = 4096
+## count and time the hot paths, snapshot them per hour and per round into test_data_dir + 'instruments.csv' and '.json'
+instrumentation = False
+## append the new metrics into Metrics/case_num/metrics.npz every metrics_flush_hours hours (e.g. 24), read it by
+## metrics_store.Metrics_store.read while running, None to keep the metrics in memory until the end
+metrics_flush_hours = None
 case_num = 'case4/'
 test_data_dir = './data/' + case_num
 # the length of log with filling "-"
@@ -27,6 +38,14 @@ PT5_cloud_d = 49.443
 PT5_edge_a = 2
 PT5_edge_b = 0.557
 PT5_edge_d = 1.443
+## opt-in: generate the data of a user and vm when it is first needed, seeded by the pair, instead of all pairs when the
+## user arrives, and take the mean of the link distribution of the vm location as the average bw of vm. It changes every
+## link value and the global random sequence, so the results differ from the eager way
+lazy_user_to_vm = False
+## (not lazy) draw the data of each user and vm one by one as the earlier version, reproduces its random number sequence but slow
+user_to_vm_sequential_sampling = False
+## the number of users whose link utilities are cached in task deployment
+user_links_cache_size = 1024
 
 # contract
 expected_max_vm_num = 80
@@ -38,6 +57,10 @@ cr_high = 1 * expected_max_vm_num
 
 # vm assignment
 mno_rate = 0.85
+## the solver of vm assignment: 'ga' genetic algorithm, 'milp' exact integer program, 'lp_rounding' rounded LP relaxation
+vm_assignment_solver = 'ga'
+## the time limit (s) of 'milp', the best vm set found is used when it is reached
+ilp_time_limit = 60
 _theta = 0.2
 _lambda = 0.7
 _mu = 0.9
@@ -67,13 +90,27 @@ ftp_bw_down_bmax = 4000
 
 # update history data
 phi = 0.9
+## the hours of hourly history data kept, at least a week for the statistic data of weekend
+history_capacity = 168
 
 # optimizing
-## the max time of searching the valid offsprings in vm assignment
-max_searching_times = 1000
 optimizing_times = 100
+## island model of vm assignment: the number of islands (1 for a single population), generations between migrations
+## and the number of worker processes (None for the number of cpu)
+island_num = 1
+migration_interval = 10
+island_workers = None
+## early termination of vm assignment, None to disable: stop after stall_generations generations without improvement,
+## when the best fitness reaches target_fitness, after time_budget seconds, or when the diversity (mean hamming distance
+## between populations over the number of vm) drops to min_diversity
+stall_generations = None
+target_fitness = None
+time_budget = None
+min_diversity = None
 offspring_number = 5
 mutate_rate = 0.05
+## draw the random numbers of crossover and mutation offspring by offspring as the earlier version, reproduces its random number sequence
+ga_seed_compatible = False
 
 @unique
 class Task_type_index(IntEnum):
@@ -1,11 +1,16 @@
 from platform import release
 import numpy as np
 from queue import Queue
+from collections import OrderedDict
 from vm import VM
 from optimizing import TaskDeploymentParametersOptimizing
 from task_handler import Task_handler
+from capacity_index import CapacityIndex
+from link_table import Link_table
+from event_trace import (Event_trace, Trace_kind)
+from instruments import Instruments
 import math
-from utils import (softmax, toSoftmax, step_logger, get_TD_populations_log_msg, sgn, Metrics)
+from utils import (softmax, toSoftmax, step_logger, get_TD_populations_log_msg, sgn, Metrics, lazy_message, task_logger)
 from parameters import *
 import logging
 
@@ -107,6 +112,96 @@ class UtilityFunc:
             task_utilities = cls.FTP
         return task_utilities
 
+def weighted_sum(weights: np.array, utilities: np.array) -> np.array:
+    '''
+    Sum up weight * utility column by column, same order as sum() over zip(weights, utilities) of a vm.
+    For M = number of vm, weights with shape (K,) gives shape (M,), weights with shape (K, P) gives shape (M, P).
+    '''
+    total = 0
+    for weight, utility in zip(weights, utilities.T):
+        total = total + np.multiply.outer(utility, weight)
+    return total
+
+class VMScoring:
+    '''
+    Feasibility and utilities of all candidate vm of a task type in one numpy pass.
+    The remaining resource and the price utility of candidate vm are kept in arrays and the remaining resource
+    in CapacityIndex for skipping the vm that cannot fit the task, the link utilities from the latest user_links_cache_size
+    users to vm are cached since they never change.
+    '''
+    # least recently used map from user id to the links shape (number of vm, 3) in the dtype of Link_table, nan if not
+    # read yet, and their utilities shape (number of vm, 3)
+    user_links = OrderedDict()
+    # the vm of each column of Link_table
+    link_vms = None
+
+    def __init__(self, candidate_vm_id: np.array, vm_list: dict):
+        self.candidate_vm_id = candidate_vm_id
+        self.vms = [vm_list[vm_id] for vm_id in candidate_vm_id]
+        # map from vm id to the index of candidate vm
+        self.position = {vm.id: idx for idx, vm in enumerate(self.vms)}
+        self.cr = np.array([vm.cr for vm in self.vms], dtype=float)
+        self.avg_bw_up = np.array([vm.avg_bw_up for vm in self.vms], dtype=float)
+        self.avg_bw_down = np.array([vm.avg_bw_down for vm in self.vms], dtype=float)
+        self.price_utility = np.array([UtilityFunc.get_task_utility_func(vm.task_type).price(vm.price) for vm in self.vms], dtype=float)
+        self.capacity = CapacityIndex(np.column_stack((self.cr, self.avg_bw_up, self.avg_bw_down)))
+        self.link_position = np.array([Link_table.vm_position[vm_id] for vm_id in candidate_vm_id], dtype=int)
+
+    @classmethod
+    def get_user_links(cls, user_id: str, vm_list: dict, link_position: np.array) -> np.array:
+        '''Get the link data and link utilities from user to the vm at link_position, only the links not read yet are read from Link_table.'''
+        if cls.link_vms is None:
+            # the columns of Link_table are in the order of vm_list
+            cls.link_vms = list(vm_list.values())
+        if user_id in cls.user_links:
+            cls.user_links.move_to_end(user_id)
+        else:
+            cls.user_links[user_id] = (np.full((len(cls.link_vms), 3), np.nan, dtype=Link_table.dtype),
+                                       np.full((len(cls.link_vms), 3), np.nan))
+            if len(cls.user_links) > user_links_cache_size:
+                cls.user_links.popitem(last=False)
+        links, utilities = cls.user_links[user_id]
+        missing = link_position[np.isnan(links[link_position, 0])]
+        if missing.size != 0:
+            links[missing] = Link_table.get_user_links(user_id, missing)
+            for position, (bw_up, bw_down, delay) in zip(missing.tolist(), links[missing].tolist()):
+                task_utility = UtilityFunc.get_task_utility_func(cls.link_vms[position].task_type)
+                utilities[position] = [task_utility.bw_up(bw_up), task_utility.bw_down(bw_down), task_utility.delay(delay)]
+        return np.hstack((links[link_position].astype(float), utilities[link_position]))
+
+    def update(self, vm: VM) -> None:
+        '''Copy the remaining resource of vm after binding or releasing a task.'''
+        idx = self.position[vm.id]
+        self.cr[idx] = vm.cr
+        self.avg_bw_up[idx] = vm.avg_bw_up
+        self.avg_bw_down[idx] = vm.avg_bw_down
+        self.capacity.update(idx, (vm.cr, vm.avg_bw_up, vm.avg_bw_down))
+
+    def score(self, task: list, vm_list: dict, op_bw: float, op_cr: float) -> tuple[np.array, np.array, np.array]:
+        '''
+        Get the feasible vm for task, in the order of candidate_vm_id.
+        For M = number of feasible vm.
+
+        Returns
+        ----------
+        positions : np.array, shape: (M,)
+            The index of feasible vm in candidate_vm_id.
+        min_bw : np.array, shape: (M,)
+            The smaller one of bw_up and bw_down from user to vm.
+        utilities : np.array, shape: (M, 4)
+            The utility of bw_up, bw_down, price and delay.
+        '''
+        # checking the vm remaining resource, only the vm that can fit the task are visited
+        positions = self.capacity.query((max(op_cr, task[Task_event_index.average_cpu_usage]),
+            task[Task_event_index.T_up], task[Task_event_index.T_down]))
+        # checking the operating value
+        links = self.get_user_links(task[Task_event_index.user_id.value], vm_list, self.link_position[positions])
+        min_bw = np.minimum(links[:, 0], links[:, 1])
+        feasible = ~(min_bw < op_bw)
+        positions, links = positions[feasible], links[feasible]
+        utilities = np.column_stack((links[:, 3], links[:, 4], self.price_utility[positions], links[:, 5]))
+        return positions, min_bw[feasible], utilities
+
 class TaskDeployment:
     '''Task Deployment!!!'''
     def __init__(self, operator, op_bw, op_cr):
@@ -139,6 +234,9 @@ class TaskDeployment:
         self.retry_times = {}
         # count vm utilization
         self.vm_used = set()
+        # the candidate vm of each task type and their arrays for scoring
+        self.candidate_vm_id = None
+        self.vm_scoring = None
 
     def __enter__(self):
         '''Initialization.'''
@@ -188,12 +286,11 @@ class TaskDeployment:
         #     self.optimizing.fitness[idx] = max(self.optimizing.fitness[idx], 0)
         #     self.optimizing.fitness[idx] /= sum(self.hour_task_num)
 
-    def deploy(self, candidate_vm_id: np.array, task: np.array, vm_list: dict) -> None:
+    @Instruments.timed('deploy_latency')
+    def deploy(self, candidate_vm_id: list, task: list, vm_list: dict) -> None:
         '''Start running TaskDeployment algorithm.'''
         # get index in task_events.json
         task_type = task[Task_event_index.task_type.value]
-        user_id = task[Task_event_index.user_id.value]
-        cpu_request = task[Task_event_index.cpu_request.value]
         task_type_idx = Task_type_index[task_type].value
         
         self.hour_task_num[task_type_idx] += 1
@@ -202,89 +299,65 @@ class TaskDeployment:
         offsprings_max_utility = [float('-inf') for _ in range(len(self.optimizing.new_populations))]
         selected_vm_id = None
         cost = 0
-        for vm_id in candidate_vm_id:
-            # deployment by best population
-            vm = vm_list[vm_id]
-            ## only accept vm of the same type
-            if vm.task_type != task_type:
-                continue
-            ## calculate the utilities
-            task_utility = UtilityFunc.get_task_utility_func(task_type)
-            bw_up = vm.from_user[user_id]['bw_up']
-            bw_down = vm.from_user[user_id]['bw_down']
-            delay = vm.from_user[user_id]['delay']
-            cr_diff = abs(cpu_request - vm.cr)
-            # checking the operating value and vm remaining resource
-            if min(bw_up, bw_down) < self.op_bw or vm.cr < self.op_cr or \
-                vm.cr < task[Task_event_index.average_cpu_usage] or vm.avg_bw_up < task[Task_event_index.T_up] or \
-                vm.avg_bw_down < task[Task_event_index.T_down]:
-                continue
-            utilities = [
-                task_utility.bw_up(bw_up),
-                task_utility.bw_down(bw_down),
-                # task_utility.cr(vm.cr),
-                task_utility.price(vm.price),
-                task_utility.delay(delay)
-                # task_utility.cr_diff(cr_diff)
-            ]
-            utility = sum([g * u for g, u in zip(self.optimizing.best_gamma[Task_type_index[task_type]], 
-                utilities)]) / sum(self.optimizing.best_gamma[Task_type_index[task_type]])
-            # virtual deployment by offsprings
-            for idx, population in enumerate(self.optimizing.new_populations):
-                population = toSoftmax(population)
-                _op_bw, _op_cr = population[-2], population[-1]
-                if min(bw_up, bw_down) < _op_bw and vm.cr < _op_cr:
-                    continue
-                _gamma = [population[0:6], population[6:12], population[12:18]]
-                _utility = sum([g * u for g, u in zip(_gamma[Task_type_index[task_type]], utilities)])
-
-                if _utility > offsprings_max_utility[idx]:
-                    offsprings_max_utility[idx] = _utility
-            # keep the best vm
-            if utility > max_utility:
-                max_utility = utility
-                max_utilities = utilities
-                selected_vm_id = vm_id
-                cost = vm.price
+        # the candidate vm are reassigned every round, only the vm of the same type are scored
+        if self.candidate_vm_id is not candidate_vm_id:
+            self.candidate_vm_id = candidate_vm_id
+            self.vm_scoring = [VMScoring(vm_id, vm_list) for vm_id in candidate_vm_id]
+        vm_scoring = self.vm_scoring[task_type_idx]
+        positions, min_bw, utilities = vm_scoring.score(task, vm_list, self.op_bw, self.op_cr)
+        Instruments.observe('deploy_vm_feasible', positions.size)
+        if positions.size != 0:
+            # deployment by best population, keep the first vm with max utility
+            gamma = self.optimizing.best_gamma[task_type_idx]
+            vm_utility = weighted_sum(gamma, utilities) / sum(gamma)
+            best = np.argmax(vm_utility)
+            max_utility = vm_utility[best]
+            max_utilities = utilities[best].tolist()
+            selected_vm_id = vm_scoring.candidate_vm_id[positions[best]]
+            cost = vm_list[selected_vm_id].price
+            # virtual deployment by all offsprings at once, shape: (vm, offspring)
+            optimizing = self.optimizing
+            cr = vm_scoring.cr[positions]
+            valid = ~((min_bw[:, None] < optimizing.offspring_op_bw) & (cr[:, None] < optimizing.offspring_op_cr))
+            offsprings_utility = weighted_sum(optimizing.offspring_gamma[task_type_idx].T, utilities)
+            offsprings_max_utility = np.max(np.where(valid, offsprings_utility, float('-inf')), axis=0).tolist()
 
         task_id = task[Task_event_index.index.value]
         if task_id not in self.retry_times:
             self.retry_times[task_id] = 0
         if selected_vm_id == None:
+            Event_trace.record(Trace_kind.block, task, self.operator, utility=max_utility)
             if self.retry_times[task_id] <= 3:
                 # if no feasible solution
                 self.reschedule_task(task)
                 self.retry_times[task_id] += 1
             else:
-                Task_handler.set_mask(task_id)
-                events = Task_handler.get_deleted_events()
-                Task_handler.delete_events()
+                Task_handler.delete_task_events(task_id)
             self.hour_task_num[task_type_idx] -= 1
             self.block_num[task_type_idx] += 1
         else:
             vm = vm_list[selected_vm_id]
             self.vm_used.add(vm.id)
+            Event_trace.record(Trace_kind.deploy, task, self.operator, vm.id, max_utility)
             self.bind_task(task, vm)
             if vm.location == 'cloud':
                 self.hour_cloud_task_num[task_type_idx] += 1
             else:
                 self.hour_edge_task_num[task_type_idx] += 1
-        logging.info(f'task utilities: {max_utilities}\n')
-        logging.info(f'task utility: {max_utility}\n')
+        task_logger.info(lazy_message(lambda: f'task utilities: {max_utilities}\n'))
+        task_logger.info(lazy_message(lambda: f'task utility: {max_utility}\n'))
     
         self.hour_utility[task_type_idx] += max(max_utility, -100)
         for idx, max_utility in enumerate(offsprings_max_utility):
             self.population_hour_utility[idx][task_type_idx] += max(max_utility, -100)
         self.user_cost += cost
 
-    def reschedule_task(self, task: np.array) -> None:
+    def reschedule_task(self, task: list) -> None:
         '''Reschedule event in task_events.'''
         task_id = task[Task_event_index.index.value]
-        Task_handler.set_mask(task_id)
-        events = Task_handler.get_deleted_events()
+        events = Task_handler.delete_task_events(task_id)
         start_event, end_event = events
         assert(len(events) == 2)
-        Task_handler.delete_events()
         event_time_idx = Task_event_index.event_time.value
         next_round_start_systime = self.starting_systime + small_round_minutes
         retry_offset = np.random.randint(5, 10)
@@ -292,58 +365,56 @@ class TaskDeployment:
             interval = end_event[event_time_idx] - start_event[event_time_idx]
             start_event[event_time_idx] = next_round_start_systime
             end_event[event_time_idx] = next_round_start_systime + interval
-            logging.info(f'Task {task_id} unaccepted, retry after {next_round_start_systime - Global.system_time + retry_offset} minutes.')
+            task_logger.info(f'Task {task_id} unaccepted, retry after {next_round_start_systime - Global.system_time + retry_offset} minutes.')
         else:
             start_event[event_time_idx] = start_event[event_time_idx] + retry_offset
             end_event[event_time_idx] = end_event[event_time_idx] + retry_offset
-            logging.info(f'Task {task_id} unaccepted, retry after {retry_offset} minutes.')
+            task_logger.info(f'Task {task_id} unaccepted, retry after {retry_offset} minutes.')
+        Event_trace.record(Trace_kind.reschedule, task, self.operator, retry_time=start_event[event_time_idx])
+        Instruments.count('reschedule')
         Task_handler.insert_event(end_event)
         Task_handler.insert_event(start_event)
 
-    def bind_task(self, task: np.array, selected_vm: VM) -> None:
+    def bind_task(self, task: list, selected_vm: VM) -> None:
         '''Consume resource of selected vm and make task as observer.'''
         task_id = task[Task_event_index.index.value]
-        _message = f'Deploy task {task_id} to vm {selected_vm.id},\n'
-
         task_cr = task[Task_event_index.average_cpu_usage.value]
-        _message += f'task cr: {task_cr}, vm cr: {selected_vm.cr} -> '
-        selected_vm.cr -= task_cr
-        _message += f'{selected_vm.cr}\n'
-
         task_T_up = task[Task_event_index.T_up.value]
-        _message += f'task bw_up: {task_T_up}, avg_bw_up: {selected_vm.avg_bw_up} -> '
-        selected_vm.avg_bw_up -= task_T_up
-        _message += f'{selected_vm.avg_bw_up}\n'
-
         task_T_down = task[Task_event_index.T_down.value]
-        _message += f'task bw_down: {task_T_down}, avg_bw_down: {selected_vm.avg_bw_down} -> '
+        before = (selected_vm.cr, selected_vm.avg_bw_up, selected_vm.avg_bw_down)
+        selected_vm.cr -= task_cr
+        selected_vm.avg_bw_up -= task_T_up
         selected_vm.avg_bw_down -= task_T_down
-        _message += f'{selected_vm.avg_bw_down}'
-        logging.info(_message)
+        if task_logger.isEnabledFor(logging.INFO):
+            task_logger.info(f'Deploy task {task_id} to vm {selected_vm.id},\n'
+                             f'task cr: {task_cr}, vm cr: {before[0]} -> {selected_vm.cr}\n'
+                             f'task bw_up: {task_T_up}, avg_bw_up: {before[1]} -> {selected_vm.avg_bw_up}\n'
+                             f'task bw_down: {task_T_down}, avg_bw_down: {before[2]} -> {selected_vm.avg_bw_down}')
+        Event_trace.record(Trace_kind.bind, task, self.operator, selected_vm.id,
+                           resource=(selected_vm.cr, selected_vm.avg_bw_up, selected_vm.avg_bw_down))
+        self.vm_scoring[Task_type_index[selected_vm.task_type]].update(selected_vm)
         task_type = task[Task_event_index.task_type.value]
         task_type_idx = Task_type_index[task_type].value
         self.hour_task_resource[task_type_idx] = [sum(i) for i in zip(self.hour_task_resource[task_type_idx], (task_cr, task_T_up, task_T_down))]
        
         self.running_task_id_to_vm[task_id] = selected_vm
 
-    def release(self, task: np.array) -> None:
+    def release(self, task: list) -> None:
         '''Release vm resource used by task.'''
         task_id = task[Task_event_index.index.value]
         vm = self.running_task_id_to_vm[task_id]
 
-        _message = f'release task {task_id} from vm {vm.id},\n'
-        _message += f'cr: {vm.cr} -> '
+        before = (vm.cr, vm.avg_bw_up, vm.avg_bw_down)
         vm.cr += task[Task_event_index.average_cpu_usage.value]
-        _message += f'{vm.cr}\n'
-
-        _message += f'avg_bw_up: {vm.avg_bw_up} -> '
         vm.avg_bw_up += task[Task_event_index.T_up.value]
-        _message += f'{vm.avg_bw_up}\n'
-
-        _message += f'avg_bw_down: {vm.avg_bw_down} -> '
         vm.avg_bw_down += task[Task_event_index.T_down.value]
-        _message += f'{vm.avg_bw_down}\n'
-        logging.info(_message)
+        if task_logger.isEnabledFor(logging.INFO):
+            task_logger.info(f'release task {task_id} from vm {vm.id},\n'
+                             f'cr: {before[0]} -> {vm.cr}\n'
+                             f'avg_bw_up: {before[1]} -> {vm.avg_bw_up}\n'
+                             f'avg_bw_down: {before[2]} -> {vm.avg_bw_down}\n')
+        Event_trace.record(Trace_kind.release, task, self.operator, vm.id, resource=(vm.cr, vm.avg_bw_up, vm.avg_bw_down))
+        self.vm_scoring[Task_type_index[vm.task_type]].update(vm)
 
         del self.running_task_id_to_vm[task_id]
 
@@ -363,8 +434,7 @@ class TaskDeployment:
         tasks = []
         # get and reschedule undone tasks
         for task_id in self.running_task_id_to_vm:
-            task_id_idx = Task_event_index.index.value
-            task = Task_handler.task_events[Task_handler.task_events[:, task_id_idx] == task_id][0]
+            task = Task_handler.get_task_events(task_id)[0]
             tasks.append(task)
             self.reschedule_task(task)
         # release undone tasks
@@ -1,35 +1,104 @@
-import numpy as np
-from parameters import (Task_event_index)
+import heapq
+import itertools
+from event_table import Event_table
+from trace_reader import Trace_reader
+from parameters import (Task_event_index, Event_type)
 
 class Task_handler:
-    task_events = None
-    mask = None
-    changed = False
+    '''
+    Priority queue of task events keyed on event_time.
+    Each entry is [event_time, order, event, removed], the order breaks the tie of event_time
+    and the removed entries are dropped lazily when they reach the top of the heap.
+    '''
+    # the entries not yet passed by get_hour_events or hour_cursor
+    heap = []
+    # map from task id to the entries of its start event and end event, the finished tasks are removed
+    task_entries = {}
+    # inserted event goes before the existing events with the same event_time
+    insert_order = itertools.count(-1, -1)
+    # the reader of the events sorted by event_time, the events are pushed when the queue needs them
+    reader = None
 
     @classmethod
-    def set_mask(cls, task_id):
-        '''Set mask for method get_deleted_events and delete_events.'''
-        cls.mask = np.where(cls.task_events[:, Task_event_index.index.value] == task_id)
+    def load(cls, reader: Trace_reader) -> None:
+        '''Build the queue from the reader of task events.'''
+        cls.heap = []
+        cls.task_entries = {}
+        cls.insert_order = itertools.count(-1, -1)
+        cls.reader = reader
 
     @classmethod
-    def get_deleted_events(cls):
-        '''Get the two events under mask.'''
-        cls.changed = True
-        return cls.task_events[cls.mask]
+    def push_events(cls, events: Event_table, start: int) -> None:
+        '''Push the events read from position start of the reader into the queue.'''
+        event_time_idx = Task_event_index.event_time.value
+        task_id_idx = Task_event_index.index.value
+        for order, event in enumerate(events.get_events(), start):
+            entry = [event[event_time_idx], order, event, False]
+            heapq.heappush(cls.heap, entry)
+            cls.task_entries.setdefault(event[task_id_idx], []).append(entry)
+
+    @classmethod
+    def load_until(cls, end_time: int) -> None:
+        '''Push the events before end_time into the queue.'''
+        start = cls.reader.position
+        cls.push_events(cls.reader.read_until(end_time), start)
+
+    @classmethod
+    def load_task(cls, task_id) -> None:
+        '''Read ahead until both the start event and the end event of task are in the queue.'''
+        while len(cls.task_entries.get(task_id, [])) < 2 and not cls.reader.exhausted():
+            start = cls.reader.position
+            cls.push_events(cls.reader.read_chunk(), start)
+
+    @classmethod
+    def get_task_events(cls, task_id) -> list:
+        '''Get the events of task ordered by event_time.'''
+        cls.load_task(task_id)
+        return [entry[2] for entry in sorted(cls.task_entries[task_id])]
 
     @classmethod
-    def delete_events(cls):
-        '''Delete the two events under mask.'''
-        cls.changed = True
-        cls.task_events = np.delete(cls.task_events, cls.mask, axis=0)
+    def delete_task_events(cls, task_id) -> list:
+        '''Delete and return the copy of events of task ordered by event_time.'''
+        cls.load_task(task_id)
+        entries = sorted(cls.task_entries.pop(task_id))
+        for entry in entries:
+            entry[3] = True
+        return [list(entry[2]) for entry in entries]
 
     @classmethod
-    def insert_event(cls, event):
+    def insert_event(cls, event: list) -> None:
         '''Insert the new event.'''
-        cls.changed = True
-        event_time_idx = Task_event_index.event_time.value
-        wh = np.where(cls.task_events[:, event_time_idx] >= event[event_time_idx])[0]
-        if wh.size == 0:
-            wh = [len(cls.task_events)]
-        insert_idx = wh[0]
-        cls.task_events = np.insert(cls.task_events, insert_idx, event, axis=0)
\ No newline at end of file
+        entry = [event[Task_event_index.event_time.value], next(cls.insert_order), event, False]
+        heapq.heappush(cls.heap, entry)
+        cls.task_entries.setdefault(event[Task_event_index.index.value], []).append(entry)
+
+    @classmethod
+    def get_hour_events(cls, minutes_range: tuple) -> Event_table:
+        '''Get the events within minutes_range ordered by event_time, events before minutes_range are passed.'''
+        cls.load_until(minutes_range[1])
+        heap = cls.heap
+        while heap and (heap[0][3] or heap[0][0] < minutes_range[0]):
+            heapq.heappop(heap)
+        entries = []
+        while heap and heap[0][0] < minutes_range[1]:
+            entry = heapq.heappop(heap)
+            if not entry[3]:
+                entries.append(entry)
+        # keep the hour events in the queue until the next hour passes them
+        for entry in entries:
+            heapq.heappush(heap, entry)
+        return Event_table.from_events([entry[2] for entry in entries], cls.reader.user_categories)
+
+    @classmethod
+    def hour_cursor(cls, minutes_range: tuple):
+        '''Yield the events within minutes_range in time order, the events inserted or deleted while iterating are taken into account.'''
+        cls.load_until(minutes_range[1])
+        heap = cls.heap
+        while heap and heap[0][0] < minutes_range[1]:
+            entry = heapq.heappop(heap)
+            if not entry[3] and entry[0] >= minutes_range[0]:
+                event = entry[2]
+                if event[Task_event_index.event_type.value] == Event_type.end:
+                    # the task finishes, no need to look it up anymore
+                    del cls.task_entries[event[Task_event_index.index.value]]
+                yield event
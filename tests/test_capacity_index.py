@@ -0,0 +1,24 @@
+import numpy as np
+from capacity_index import CapacityIndex
+
+def fit(resources: np.array, need: tuple) -> np.array:
+    '''The vm fit need by scanning all of them.'''
+    return np.flatnonzero(np.all(resources >= need, axis=1))
+
+def test_query_matches_scan():
+    rng = np.random.default_rng(0)
+    for vm_num in (0, 1, 2, 5, 16, 33):
+        resources = rng.integers(0, 5, size=(vm_num, 3)).astype(float)
+        index = CapacityIndex(resources)
+        for _ in range(50):
+            if vm_num != 0:
+                # bind or release a task on a random vm
+                idx = int(rng.integers(vm_num))
+                resources[idx] = rng.integers(0, 5, size=3)
+                index.update(idx, resources[idx])
+            need = tuple(rng.integers(0, 5, size=3))
+            np.testing.assert_array_equal(index.query(need), fit(resources, need))
+
+def test_query_zero_need_gives_all_vm():
+    resources = np.zeros((7, 3))
+    np.testing.assert_array_equal(CapacityIndex(resources).query((0, 0, 0)), np.arange(7))
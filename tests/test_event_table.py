@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from event_table import Event_table
+from parameters import (Task_event_index, Task_type_index)
+
+def make_events(event_num: int) -> list:
+    task_types = [task_type.name for task_type in Task_type_index]
+    return [[idx, idx % 2, 10 * idx, task_types[idx % 3], str(1000 + idx % 4), 0.5 * idx, 0.25, 100. + idx, 200.]
+            for idx in range(event_num)]
+
+def test_round_trip():
+    events = make_events(20)
+    table = Event_table.from_events(events)
+    assert len(table) == 20
+    assert list(table) == events
+    assert table.get_events() == events
+    assert table[3] == events[3]
+    assert table[np.int64(7)] == events[7]
+    assert table[-1] == events[-1]
+    assert list(table[5:9]) == events[5:9]
+    assert list(table[table[:, Task_event_index.event_type.value] == 1]) == events[1::2]
+    np.testing.assert_array_equal(table[:, Task_event_index.event_time.value], [event[2] for event in events])
+
+def test_user_categories():
+    events = make_events(20)
+    table = Event_table.from_events(events)
+    assert list(Event_table.from_events(events[4:9], table.user_categories)) == events[4:9]
+    assert len(Event_table.from_events([], table.user_categories)) == 0
+    # before, between and after the known user ids
+    for user_id in ('0999', '1001a', '9999'):
+        unknown = [list(event) for event in events]
+        unknown[2][Task_event_index.user_id.value] = user_id
+        with pytest.raises(ValueError):
+            Event_table.from_events(unknown, table.user_categories)
+
+def test_save_load(tmp_path):
+    events = make_events(20)
+    Event_table.from_events(events).save(str(tmp_path) + '/table/')
+    table = Event_table.load(str(tmp_path) + '/table/')
+    assert list(table) == events
+    assert table[11] == events[11]
+
+def test_sorted_by_time_is_stable():
+    events = make_events(10)
+    for event in events:
+        event[Task_event_index.event_time.value] = 50 - event[Task_event_index.event_time.value] // 30
+    table = Event_table.from_events(events).sorted_by_time()
+    assert list(table) == sorted(events, key=lambda event: event[Task_event_index.event_time.value])
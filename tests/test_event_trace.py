@@ -0,0 +1,29 @@
+from event_trace import (Event_trace, Event_trace_reader, Trace_kind)
+from parameters import Global
+
+def test_read_back_with_partial_record(tmp_path, monkeypatch):
+    filename = str(tmp_path) + '/event_trace.bin'
+    monkeypatch.setattr(Global, 'system_time', 3600)
+    Event_trace.open(filename, ['vm_a', 'vm_b'], buffer_size=4)
+    for task_id in range(10):
+        task = [task_id, 0, 3600, 'VoIP', '7', 0.5, 0.25, 10., 20.]
+        if task_id % 3 == 0:
+            Event_trace.record(Trace_kind.block, task, 'MVNO')
+        else:
+            Event_trace.record(Trace_kind.deploy, task, 'MNO', vm_id='vm_b', utility=1.)
+    Event_trace.close()
+    # a record cut by a killed run
+    with open(filename, 'ab') as f:
+        f.write(b'\0' * (Event_trace.dtype.itemsize // 2))
+    reader = Event_trace_reader(filename)
+    assert len(reader) == 10
+    assert reader.records['task_id'].tolist() == list(range(10))
+    assert reader.count() == {'deploy': 6, 'block': 4}
+    assert reader.query(kind='block', operator='MVNO')['task_id'].tolist() == [0, 3, 6, 9]
+    assert len(reader.query(vm_id='vm_b', time_range=(3600, 3601))) == 6
+
+def test_read_empty_trace(tmp_path):
+    filename = str(tmp_path) + '/event_trace.bin'
+    Event_trace.open(filename, [])
+    Event_trace.close()
+    assert len(Event_trace_reader(filename)) == 0
@@ -0,0 +1,58 @@
+import numpy as np
+from ga_operators import (two_point_crossover, flip_mutation)
+
+def loop_crossover(parents: np.array, high: int) -> np.array:
+    '''The earlier two-points crossover gene by gene.'''
+    points = [np.random.randint(0, high) for _ in range(2)]
+    left, right = min(points), max(points)
+    selected_gene = np.zeros((len(parents), right - left + 1))
+    for idx, parent in enumerate(parents):
+        selected_gene[idx] = parent[left:right + 1]
+    randomize = np.arange(len(selected_gene))
+    np.random.shuffle(randomize)
+    parents[:, left:right + 1] = selected_gene[randomize]
+    return parents
+
+def loop_mutation(offsprings: np.array, rate: float, regenerate) -> np.array:
+    '''The earlier flip mutation offspring by offspring and bit by bit.'''
+    for i in range(len(offsprings)):
+        if np.random.random() < rate:
+            offsprings[i] = regenerate()
+        else:
+            mutate = np.random.choice([True, False], offsprings[i].shape, p=[rate, 1 - rate])
+            for j in range(len(offsprings[i])):
+                if mutate[j]:
+                    offsprings[i, j] = np.logical_not(offsprings[i, j])
+    return offsprings
+
+def test_crossover_matches_loop():
+    rng = np.random.default_rng(0)
+    for seed in range(50):
+        parents = rng.random((5, 12)) < 0.5
+        np.random.seed(seed)
+        expected = loop_crossover(parents.copy(), 12)
+        np.random.seed(seed)
+        offsprings, left, right, order = two_point_crossover(parents.copy(), 12)
+        np.testing.assert_array_equal(offsprings, expected)
+        np.testing.assert_array_equal(offsprings[:, left:right + 1], parents[order, left:right + 1])
+
+def test_seed_compatible_mutation_matches_loop():
+    rng = np.random.default_rng(1)
+    regenerate = lambda: np.random.random(12) < 0.5
+    for seed in range(50):
+        offsprings = rng.random((5, 12)) < 0.5
+        np.random.seed(seed)
+        expected = loop_mutation(offsprings.copy(), 0.2, regenerate)
+        np.random.seed(seed)
+        mutated, regenerated, mask = flip_mutation(offsprings.copy(), 0.2, regenerate, seed_compatible=True)
+        np.testing.assert_array_equal(mutated, expected)
+        np.testing.assert_array_equal(mutated[~regenerated], offsprings[~regenerated] ^ mask[~regenerated])
+
+def test_batch_mutation_flips_masked_bits():
+    offsprings = np.random.default_rng(2).random((200, 50)) < 0.5
+    np.random.seed(0)
+    mutated, regenerated, mask = flip_mutation(offsprings.copy(), 0.05, lambda: np.ones(50, dtype=bool), seed_compatible=False)
+    np.testing.assert_array_equal(mutated[~regenerated], offsprings[~regenerated] ^ mask[~regenerated])
+    assert np.all(mutated[regenerated]) and not np.any(mask[regenerated])
+    # about rate of the offsprings regenerated and of the bits flipped
+    assert 0 < np.count_nonzero(regenerated) < 30 and 0.03 < mask[~regenerated].mean() < 0.07
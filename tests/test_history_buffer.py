@@ -0,0 +1,23 @@
+import numpy as np
+from history_buffer import History_buffer
+
+def test_get_matches_stacked_history():
+    rng = np.random.default_rng(0)
+    buffer = History_buffer(168)
+    history = np.zeros((0, 3, 3))
+    # single hours, a day at once and more hours than the capacity at once
+    for hour_num in [1] * 30 + [24] * 5 + [200, 1, 3]:
+        hours = rng.random((hour_num, 3, 3))
+        buffer.append(hours)
+        history = np.vstack((history, hours))
+        assert len(buffer) == min(len(history), 168)
+        np.testing.assert_array_equal(buffer.get(), history[-168:])
+        if len(history) >= 168:
+            np.testing.assert_array_equal(buffer.get(-168, -145), history[-168:-145])
+        np.testing.assert_array_equal(buffer.get(-24), history[-168:][-24:])
+
+def test_append_a_single_hour():
+    buffer = History_buffer(2)
+    for value in range(3):
+        buffer.append(np.full((3, 3), value))
+    np.testing.assert_array_equal(buffer.get()[:, 0, 0], [1, 2])
@@ -0,0 +1,43 @@
+import numpy as np
+from link_table import Link_table
+
+def generator(location: str, keys: dict) -> dict:
+    '''Uniform links in [0, 1000) Kbps on cloud and [0, 600) Kbps on edge, the same key gives the same value.'''
+    scale = 1000 if location == 'cloud' else 600
+    generator.generated += len(keys['bw_up'])
+    return {field: (keys[field] >> np.uint64(11)) * 2.0 ** -53 * scale for field in keys}
+
+def test_lazy_links_do_not_depend_on_read_order():
+    vm_id_list = [f'vm_{idx}' for idx in range(8)]
+    generator.generated = 0
+    Link_table.load(vm_id_list, ['cloud', 'edge'] * 4, generator)
+    Link_table.add_users(['a', 'b', 'c'])
+    links = Link_table.get_user_links('b', np.arange(8))
+    assert links.shape == (8, 3) and links.dtype == Link_table.dtype
+    np.testing.assert_array_equal(Link_table.get_user_links('b', np.array([5, 2])), links[[5, 2]])
+    Link_table.load(vm_id_list, ['cloud', 'edge'] * 4, generator)
+    Link_table.add_users(['c', 'b'])
+    np.testing.assert_array_equal(Link_table.get_user_links('b', np.arange(8)), links)
+
+def test_lazy_avg_bw_generates_no_pair():
+    generator.generated = 0
+    Link_table.load([f'vm_{idx}' for idx in range(8)], ['cloud', 'edge'] * 4, generator)
+    Link_table.add_users([str(user_id) for user_id in range(100000)])
+    avg_bw_up, avg_bw_down = Link_table.get_avg_bw()
+    # only the sample of each location is generated, not the 800000 pairs
+    assert generator.generated == 2 * Link_table.sample_size
+    np.testing.assert_allclose(avg_bw_up, [500, 300] * 4, rtol=0.02)
+    np.testing.assert_allclose(avg_bw_down, [500, 300] * 4, rtol=0.02)
+    Link_table.add_users(['new user'])
+    np.testing.assert_array_equal(Link_table.get_avg_bw()[0], avg_bw_up)
+    assert generator.generated == 2 * Link_table.sample_size
+
+def test_eager_avg_bw_is_mean_over_users():
+    links = np.random.default_rng(0).random((5, 4, 3)).astype(Link_table.dtype)
+    Link_table.load(['w', 'x', 'y', 'z'], ['cloud'] * 4)
+    Link_table.add_users(['a', 'b'], links[:2])
+    Link_table.add_users(['c', 'd', 'e'], links[2:])
+    np.testing.assert_array_equal(Link_table.get_user_links('d', np.array([3, 1])), links[3, [3, 1]])
+    avg_bw_up, avg_bw_down = Link_table.get_avg_bw()
+    np.testing.assert_allclose(avg_bw_up, links[:, :, 0].astype(float).mean(axis=0))
+    np.testing.assert_allclose(avg_bw_down, links[:, :, 1].astype(float).mean(axis=0))
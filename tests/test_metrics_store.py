@@ -0,0 +1,32 @@
+import numpy as np
+from metrics_store import (Metrics_store, Metric_array)
+
+def test_read_back_flushed_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(Metrics_store, 'filename', None)
+    monkeypatch.setattr(Metrics_store, 'chunks', {})
+    Metrics_store.open(str(tmp_path) + '/metrics/metrics.npz')
+    rng = np.random.default_rng(0)
+    metric = Metric_array('statistic_data', (3, 3), capacity=2)
+    counter = Metric_array('task_num', dtype=np.int64)
+    rows = []
+    for flush in range(4):
+        for _ in range(5):
+            rows.append(rng.random((3, 3)))
+            metric.append(rows[-1])
+            counter.append(len(rows))
+        Metrics_store.write({metric.name: metric.pop_rows(), counter.name: counter.pop_rows()})
+        assert len(metric) == len(rows)
+    # the rows in memory are read after the flushed ones
+    metric.append(rows[0])
+    np.testing.assert_array_equal(np.array(metric), np.array(rows + rows[:1]))
+    np.testing.assert_array_equal(Metrics_store.read(Metrics_store.filename, 'task_num'), np.arange(1, 21))
+    metrics = Metrics_store.read(Metrics_store.filename)
+    assert sorted(metrics) == ['statistic_data', 'task_num']
+    assert metrics['task_num'].dtype == np.int64
+
+def test_rows_in_memory_only():
+    metric = Metric_array('block_rate')
+    for value in range(100):
+        metric.append(value / 100)
+    assert len(metric) == 100
+    np.testing.assert_array_equal(np.array(metric), np.arange(100) / 100)
@@ -0,0 +1,128 @@
+import itertools
+import math
+import numpy as np
+import pytest
+from optimizing import (GeneticOptimizing, VMAssignmentOptimizing)
+from contract import Contract
+from vm import VM
+from parameters import (offspring_number, Task_type_index, _theta)
+
+def make_vm_list(vm_num: int, rng: np.random.Generator, free: bool = False) -> dict:
+    vm_list = {}
+    for idx in range(vm_num):
+        vm = VM({'id': idx, 'task_type': Task_type_index(idx % len(Task_type_index)).name, 'location': 'edge',
+                 'cpu_capacity': float(rng.random() * 4), 'price': 0. if free and idx % 2 else float(rng.random() * 10 + 1)})
+        vm.avg_bw_up = float(rng.random() * 3000)
+        vm.avg_bw_down = float(rng.random() * 3000)
+        vm_list[idx] = vm
+    return vm_list
+
+def make_contract(rng: np.random.Generator) -> Contract:
+    contract = Contract()
+    contract.bw_low = rng.random() * 8000
+    contract.bw_high = rng.random() * 40000 + 4000
+    contract.cr_low = rng.random() * 4
+    contract.cr_high = rng.random() * 20 + 2
+    return contract
+
+def check_condition(optimizing: VMAssignmentOptimizing, selected_vm: np.array, statistic_data: np.array) -> bool:
+    '''The conditions checked vm by vm as the earlier check_condition.'''
+    contract = optimizing.contract
+    bw_up, bw_down, cr = ([0. for _ in Task_type_index] for _ in range(3))
+    for vm_id in optimizing.candidate_vm_id[selected_vm]:
+        vm = optimizing.vm_list[vm_id]
+        task_idx = Task_type_index[vm.task_type].value
+        bw_up[task_idx] += vm.avg_bw_up
+        bw_down[task_idx] += vm.avg_bw_down
+        cr[task_idx] += vm.cr
+    # statistic data of each task type is (cr, T_up, T_down)
+    task_cond = all(bw_up[idx] >= statistic_data[idx][1] * _theta and bw_down[idx] >= statistic_data[idx][2] * _theta
+                    and cr[idx] >= statistic_data[idx][0] * _theta for idx in range(len(Task_type_index)))
+    return task_cond and contract.bw_low <= min(sum(bw_up), sum(bw_down)) and max(sum(bw_up), sum(bw_down)) <= contract.bw_high\
+        and contract.cr_low <= sum(cr) <= contract.cr_high
+
+def make_statistic_data(rng: np.random.Generator) -> np.array:
+    return rng.random((3, 3)) * np.array([3, 6000, 6000])
+
+def test_SUS_matches_wheel():
+    rng = np.random.default_rng(0)
+    for trial in range(100):
+        populations = rng.random((offspring_number, 8)) < 0.5
+        fitness = (rng.random(offspring_number) * 100 - 10).tolist()
+        fitness[0] = abs(fitness[0]) + 2 * offspring_number
+        # the earlier selection on the wheel with ceil(fitness) copies of each population
+        np.random.seed(trial)
+        wheel = np.vstack([np.full((math.ceil(max(0, value)), 8), population) for value, population in zip(fitness, populations)])
+        P = int(sum(fitness) // offspring_number)
+        expected = wheel[np.random.randint(0, P) + np.arange(offspring_number) * P]
+        np.random.seed(trial)
+        np.testing.assert_array_equal(GeneticOptimizing.SUS(populations, fitness), expected)
+
+def test_check_conditions_match_scalar_check():
+    rng = np.random.default_rng(1)
+    vm_list = make_vm_list(30, rng)
+    for _ in range(20):
+        optimizing = VMAssignmentOptimizing(make_contract(rng), np.array(list(vm_list)), vm_list)
+        statistic_data = make_statistic_data(rng)
+        populations = rng.random((50, 30)) < rng.random((50, 1))
+        expected = [check_condition(optimizing, population, statistic_data) for population in populations]
+        np.testing.assert_array_equal(optimizing.check_conditions(populations, statistic_data), expected)
+        assert optimizing.check_condition(populations[0], statistic_data) == expected[0]
+
+def test_repair_without_upper_bounds_always_succeeds():
+    rng = np.random.default_rng(2)
+    for trial in range(100):
+        vm_list = make_vm_list(20, rng, free=trial % 3 == 0)
+        contract = make_contract(rng)
+        contract.bw_high, contract.cr_high = np.inf, np.inf
+        optimizing = VMAssignmentOptimizing(contract, np.array(list(vm_list)), vm_list)
+        statistic_data = make_statistic_data(rng)
+        if not optimizing.check_condition(np.ones(20, dtype=bool), statistic_data):
+            continue
+        for _ in range(5):
+            with np.errstate(all='raise'):
+                repaired = optimizing.repair(rng.random(20) < rng.random(), statistic_data)
+            assert check_condition(optimizing, repaired, statistic_data)
+
+def test_repair_gives_feasible_vm_set():
+    rng = np.random.default_rng(3)
+    vm_num = 10
+    all_vm_sets = np.array(list(itertools.product([False, True], repeat=vm_num)))
+    feasible_cases = infeasible_cases = 0
+    for trial in range(300):
+        # half of the vm are free in some cases, their price is 0
+        vm_list = make_vm_list(vm_num, rng, free=trial % 3 == 0)
+        optimizing = VMAssignmentOptimizing(make_contract(rng), np.array(list(vm_list)), vm_list)
+        statistic_data = make_statistic_data(rng) / 4
+        selected_vm = rng.random(vm_num) < rng.random()
+        if not np.any(optimizing.check_conditions(all_vm_sets, statistic_data)):
+            infeasible_cases += 1
+            with pytest.raises(ValueError):
+                optimizing.repair(selected_vm, statistic_data)
+            continue
+        feasible_cases += 1
+        with np.errstate(all='raise'):
+            repaired = optimizing.repair(selected_vm, statistic_data)
+        assert check_condition(optimizing, repaired, statistic_data)
+    assert feasible_cases >= 100 and infeasible_cases >= 10
+
+def test_step_keeps_parent_when_repair_fails(monkeypatch):
+    rng = np.random.default_rng(4)
+    vm_list = make_vm_list(20, rng)
+    contract = make_contract(rng)
+    contract.bw_high, contract.cr_high = np.inf, np.inf
+    optimizing = VMAssignmentOptimizing(contract, np.array(list(vm_list)), vm_list)
+    statistic_data = make_statistic_data(rng) / 4
+    np.random.seed(0)
+    populations = optimizing.step(statistic_data)
+    optimizing.fitness = [100. for _ in range(offspring_number)]
+    optimizing.best_population = populations[0]
+    failed = []
+    def repair(selected_vm, statistic_data):
+        failed.append(selected_vm)
+        raise ValueError('stuck')
+    monkeypatch.setattr(optimizing, 'repair', repair)
+    for _ in range(10):
+        offsprings = optimizing.step(statistic_data)
+        assert all(check_condition(optimizing, offspring, statistic_data) for offspring in offsprings)
+    assert len(failed) != 0
@@ -0,0 +1,81 @@
+import numpy as np
+from event_table import Event_table
+from trace_reader import Trace_reader
+from task_handler import Task_handler
+from parameters import (Task_event_index, Event_type, Task_type_index)
+
+def make_events(task_num: int, rng: np.random.Generator) -> list:
+    '''The start and end events of task_num tasks sorted by event_time, the ties keep the order of task id.'''
+    events = []
+    for task_id in range(task_num):
+        start = int(rng.integers(0, 100))
+        end = start + int(rng.integers(1, 30))
+        task_type = Task_type_index(task_id % len(Task_type_index)).name
+        for event_type, event_time in ((Event_type.start, start), (Event_type.end, end)):
+            events.append([task_id, event_type.value, event_time, task_type, str(task_id % 7), 0.5, 0.25, 10., 20.])
+    return sorted(events, key=lambda event: event[Task_event_index.event_time.value])
+
+class Insert_queue:
+    '''The event table of the earlier Task_handler, events are inserted by np.insert-like list insertion.'''
+    def __init__(self, events: list):
+        self.events = [list(event) for event in events]
+
+    def insert_event(self, event: list) -> None:
+        event_time_idx = Task_event_index.event_time.value
+        later = [idx for idx, other in enumerate(self.events) if other[event_time_idx] >= event[event_time_idx]]
+        self.events.insert(later[0] if later else len(self.events), list(event))
+
+    def delete_task_events(self, task_id) -> list:
+        deleted = [event for event in self.events if event[Task_event_index.index.value] == task_id]
+        self.events = [event for event in self.events if event[Task_event_index.index.value] != task_id]
+        return deleted
+
+    def get_hour_events(self, minutes_range: tuple) -> list:
+        event_time_idx = Task_event_index.event_time.value
+        return [event for event in self.events if minutes_range[0] <= event[event_time_idx] < minutes_range[1]]
+
+def test_hour_events_match_insert_queue():
+    rng = np.random.default_rng(0)
+    events = make_events(200, rng)
+    Task_handler.load(Trace_reader(Event_table.from_events(events), chunk_size=16))
+    reference = Insert_queue(events)
+    next_task_id = 200
+    for hour in range(0, 140, 10):
+        minutes_range = (hour, hour + 10)
+        # reschedule a few tasks of the hour to later, as the task deployment does with the blocked tasks
+        for event in reference.get_hour_events(minutes_range)[::5]:
+            task_id = event[Task_event_index.index.value]
+            if event[Task_event_index.event_type.value] != Event_type.start:
+                continue
+            deleted = Task_handler.delete_task_events(task_id)
+            assert deleted == reference.delete_task_events(task_id)
+            for new_event in deleted:
+                new_event[Task_event_index.index.value] = next_task_id
+                new_event[Task_event_index.event_time.value] += int(rng.integers(1, 20))
+                Task_handler.insert_event(new_event)
+                reference.insert_event(new_event)
+            next_task_id += 1
+        assert list(Task_handler.get_hour_events(minutes_range)) == reference.get_hour_events(minutes_range)
+
+def test_hour_cursor_yields_inserted_events():
+    events = make_events(50, np.random.default_rng(1))
+    Task_handler.load(Trace_reader(Event_table.from_events(events)))
+    reference = Insert_queue(events)
+    yielded = []
+    for event in Task_handler.hour_cursor((0, 200)):
+        yielded.append(event)
+        task_id = event[Task_event_index.index.value]
+        # retry each task once 5 minutes later
+        if event[Task_event_index.event_type.value] == Event_type.start and task_id < 50:
+            deleted = Task_handler.delete_task_events(task_id)
+            assert deleted == reference.delete_task_events(task_id)
+            for new_event in deleted:
+                new_event[Task_event_index.index.value] = task_id + 50
+                new_event[Task_event_index.event_time.value] += 5
+                Task_handler.insert_event(new_event)
+                reference.insert_event(new_event)
+    # the retried events are yielded once again at their new event_time
+    event_time_idx = Task_event_index.event_time.value
+    assert [event[event_time_idx] for event in yielded] == sorted(event[event_time_idx] for event in yielded)
+    starts = [event for event in events if event[Task_event_index.event_type.value] == Event_type.start]
+    assert sorted(map(tuple, yielded)) == sorted(map(tuple, starts + reference.events))
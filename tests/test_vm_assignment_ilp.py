@@ -0,0 +1,25 @@
+import itertools
+import numpy as np
+from optimizing import VMAssignmentOptimizing
+from vm_assignment_ilp import VMAssignmentILP
+from test_optimizing import (make_vm_list, make_contract, make_statistic_data, check_condition)
+
+def test_milp_gives_cheapest_feasible_vm_set():
+    rng = np.random.default_rng(5)
+    all_vm_sets = np.array(list(itertools.product([False, True], repeat=10)))
+    feasible_cases = 0
+    for _ in range(60):
+        vm_list = make_vm_list(10, rng)
+        optimizing = VMAssignmentOptimizing(make_contract(rng), np.array(list(vm_list)), vm_list)
+        statistic_data = make_statistic_data(rng) / 4
+        feasible = optimizing.check_conditions(all_vm_sets, statistic_data)
+        if not np.any(feasible):
+            continue
+        feasible_cases += 1
+        solver = VMAssignmentILP(optimizing)
+        selected_vm = solver.solve(statistic_data, 'milp')
+        assert check_condition(optimizing, selected_vm, statistic_data)
+        assert np.isclose(optimizing.prices[selected_vm].sum(), np.min(all_vm_sets[feasible] @ optimizing.prices))
+        # the LP relaxation is rounded and repaired into a vm set fit the conditions
+        assert check_condition(optimizing, solver.solve(statistic_data, 'lp_rounding'), statistic_data)
+    assert feasible_cases >= 30
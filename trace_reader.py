@@ -0,0 +1,42 @@
+import numpy as np
+from event_table import Event_table
+from parameters import (Task_event_index)
+
+class Trace_reader:
+    '''
+    Read the task events sorted by event_time forward in hour windows or chunks.
+    With the memory-mapped Event_table of convert_trace.py, only the read part of the trace is paged in.
+    '''
+    def __init__(self, task_events: Event_table, chunk_size: int = 4096):
+        self.task_events = task_events
+        self.user_categories = task_events.user_categories
+        self.event_time = task_events[:, Task_event_index.event_time.value]
+        # the number of events already read
+        self.position = 0
+        # the number of events to read at a time when searching forward
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return len(self.task_events)
+
+    def exhausted(self) -> bool:
+        return self.position >= len(self.task_events)
+
+    def has_events_after(self, time: int) -> bool:
+        '''Whether there is any event later than time in the trace.'''
+        return len(self.event_time) != 0 and self.event_time[-1] > time
+
+    def read(self, stop: int) -> Event_table:
+        '''Read the events until position stop.'''
+        stop = max(min(stop, len(self.task_events)), self.position)
+        events = self.task_events[self.position:stop]
+        self.position = stop
+        return events
+
+    def read_until(self, end_time: int) -> Event_table:
+        '''Read the events before end_time.'''
+        return self.read(int(np.searchsorted(self.event_time, end_time)))
+
+    def read_chunk(self) -> Event_table:
+        '''Read the next chunk_size events ahead.'''
+        return self.read(self.position + self.chunk_size)
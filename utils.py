@@ -2,8 +2,11 @@ import numpy as np
 from time import time
 import scipy.integrate as integrate
 import math
+import functools
 import logging
 from parameters import (rnd_seed, Task_type_index, case_num, big_round_times)
+from instruments import Instruments
+from metrics_store import (Metrics_store, Metric_array)
 import matplotlib.pyplot as plt
 import os
 
@@ -29,6 +32,22 @@ def funcCall(func):
         return data
     return decorate
 
+class lazy_message:
+    '''
+    Log message built by func only when a handler emits the record, e.g. logging.debug(lazy_message(lambda: f'{populations}')),
+    the records dropped by the level are never formatted.
+    '''
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self) -> str:
+        return self.func()
+
+# the per task and per hour log of the hot path, quiet_logging drops its records
+task_logger = logging.getLogger('task')
+
 def toSoftmax(population: np.array) -> np.array:
     return np.concatenate((softmax(population[0:6]), softmax(population[6:12]), softmax(population[12:18]), population[18:]))
 
@@ -57,7 +76,8 @@ class step_logger:
         self.logger = logger
 
     def __enter__(self):
-        self.logger(f'{self.in_msg:-^{self.in_title}}')
+        # in_msg may be lazy_message, formatted only when the record is emitted
+        self.logger(lazy_message(lambda: f'{str(self.in_msg):-^{self.in_title}}'))
 
     def __exit__(self, type, value, traceback):
         self.logger(self.out_msg)
@@ -81,30 +101,99 @@ def timer(func):
     def decorate(*args, **kwargs):
         t1 = time()
         result = func(*args, **kwargs)
-        logging.info(f'Function {func.__name__} executed in {time() - t1:.4f}s')
+        elapsed = time() - t1
+        logging.info(f'Function {func.__name__} executed in {elapsed:.4f}s')
+        Instruments.observe(f'{func.__name__}_time', elapsed)
         return result
     return decorate
 
-def beta(a, b, t, d):
-    '''Beta Distribution Generator.'''
+def mix64(z: np.array) -> np.array:
+    '''SplitMix64 finalizer, map each uint64 to a well mixed uint64.'''
+    z = np.asarray(z, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return z ^ (z >> np.uint64(31))
+
+def keyed_uniform(keys: np.array, stream: int) -> np.array:
+    '''Uniform number in [0, 1) of each uint64 key, the same key and stream always give the same number.'''
+    return (mix64(keys ^ mix64(stream + 1)) >> np.uint64(11)) * 2.0 ** -53
+
+def keyed_rejection(keys: np.array, distribution, low: float, high: float, max_val: float) -> np.array:
+    '''
+    Rejection sampling of one value for each uint64 key.
+    The k-th trial of a key uses the uniform numbers of its own key, so the value does not depend on the other keys.
+    '''
+    samples = np.empty(len(keys))
+    pending = np.arange(len(keys))
+    trial = 0
+    while pending.size != 0:
+        x = low + (high - low) * keyed_uniform(keys[pending], 2 * trial)
+        y = max_val * keyed_uniform(keys[pending], 2 * trial + 1)
+        accepted = y <= distribution(x)
+        samples[pending[accepted]] = x[accepted]
+        pending = pending[~accepted]
+        trial += 1
+    return samples
+
+@functools.lru_cache(maxsize=None)
+def beta_normalizer(a, b) -> float:
+    '''The integral of the beta distribution kernel over [0, 1], it is constant for the same a, b.'''
+    return integrate.quad(lambda x: x ** (a - 1) * (1 - x) ** (b - 1), 0, 1)[0]
+
+def beta(a, b, t, d, size: int = None, keys: np.array = None):
+    '''
+    Beta Distribution Generator.
+    Without size, draw one value by rejection sampling, consuming the random numbers in the same way as before.
+    With size, draw size values at once as np.array from the same distribution.
+    With keys, draw one value for each uint64 key as np.array from the same distribution, the same key gives the same value.
+    '''
+    if size is not None:
+        return (np.random.beta(a, b, size) * t + d) * 1000 # to Kbps
+
+    normalizer = beta_normalizer(a, b)
     def distribution(x):
-        return ((x - d) / t) ** (a - 1) * (1 - (x - d) / t) ** (b - 1) / integrate.quad(lambda x: x ** (a - 1) * (1 - x) ** (b - 1), 0, 1)[0]
+        return ((x - d) / t) ** (a - 1) * (1 - (x - d) / t) ** (b - 1) / normalizer
 
     mode = (a - 1) / (a + b - 2)
     max_val = distribution(mode * t + d)
+    if keys is not None:
+        return keyed_rejection(keys, distribution, d, d + t, max_val) * 1000 # to Kbps
+
     while True:
         x = np.random.uniform(d, d + t)
         y = np.random.uniform(0, max_val)
         if y <= distribution(x):
             return x * 1000 # to Kbps
 
-def PT5(a, b, d, max_x = 20):
-    '''Pearson Type 5 Distribution Generator.'''
+def PT5(a, b, d, max_x = 20, size: int = None, keys: np.array = None):
+    '''
+    Pearson Type 5 Distribution Generator.
+    Without size, draw one value by rejection sampling, consuming the random numbers in the same way as before.
+    With size, draw size values at once as np.array by rejection sampling in batch from the same distribution.
+    With keys, draw one value for each uint64 key as np.array from the same distribution, the same key gives the same value.
+    '''
     def distribution(x):
         return (x - d) ** -(a - 1) * math.exp(-b / (x - d)) * b ** a / math.factorial(a - 1)
 
+    def batch_distribution(x):
+        # x = d gives nan, which is never accepted
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (x - d) ** -(a - 1) * np.exp(-b / (x - d)) * b ** a / math.factorial(a - 1)
+
     mode = b / (a + 1) + d
     max_val = distribution(mode)
+    if size is not None:
+        samples = np.empty(0)
+        while len(samples) < size:
+            n = size - len(samples)
+            x = np.random.uniform(d, max_x + d, n)
+            y = np.random.uniform(0, max_val, n)
+            samples = np.concatenate((samples, x[y <= batch_distribution(x)]))
+        return samples[:size] # ms
+    if keys is not None:
+        return keyed_rejection(keys, batch_distribution, d, max_x + d, max_val) # ms
+
     while True:
         x = np.random.uniform(d, max_x + d)
         y = np.random.uniform(0, max_val)
@@ -118,28 +207,28 @@ def sgn(x):
         return -1
 
 class Metrics:
-    '''For plotting the result.'''
+    '''For plotting the result, the metrics are flushed into Metrics_store if it is opened.'''
     # roundly
-    statistic_data = [] # 3x3
-    mno_vm_resource = [] # 3x3
-    mvno_vm_resource = [] # 3x3
-    mvno_vm_cost = [] # float
-    mno_vm_utilization = [] # float
-    mvno_vm_utilization = [] # float
+    statistic_data = Metric_array('statistic_data', (3, 3)) # 3x3
+    mno_vm_resource = Metric_array('mno_vm_resource', (3, 3)) # 3x3
+    mvno_vm_resource = Metric_array('mvno_vm_resource', (3, 3)) # 3x3
+    mvno_vm_cost = Metric_array('mvno_vm_cost') # float
+    mno_vm_utilization = Metric_array('mno_vm_utilization') # float
+    mvno_vm_utilization = Metric_array('mvno_vm_utilization') # float
     # hourly
-    hour_data = [] # 3x3
-    mno_task_fitness = [] # (VoIP, IP Video, FTP)
-    mno_task_resource = [] # 3x3
-    mvno_task_fitness = [] # (VoIP, IP Video, FTP)
-    mvno_task_resource = [] # 3x3
-    mno_block_rate = [] # (VoIP, IP Video, FTP)
-    mvno_block_rate = [] # (VoIP, IP Video, FTP)
-    mno_user_cost = [] # float
-    mvno_user_cost = [] # float
-    mno_cloud_task_num = [] # (VoIP, IP Video, FTP)
-    mno_edge_task_num = [] # (VoIP, IP Video, FTP)
-    mvno_cloud_task_num = [] # (VoIP, IP Video, FTP)
-    mvno_edge_task_num = [] # (VoIP, IP Video, FTP)
+    hour_data = Metric_array('hour_data', (3, 3)) # 3x3
+    mno_task_fitness = Metric_array('mno_task_fitness', (3,)) # (VoIP, IP Video, FTP)
+    mno_task_resource = Metric_array('mno_task_resource', (3, 3)) # 3x3
+    mvno_task_fitness = Metric_array('mvno_task_fitness', (3,)) # (VoIP, IP Video, FTP)
+    mvno_task_resource = Metric_array('mvno_task_resource', (3, 3)) # 3x3
+    mno_block_rate = Metric_array('mno_block_rate', (3,)) # (VoIP, IP Video, FTP)
+    mvno_block_rate = Metric_array('mvno_block_rate', (3,)) # (VoIP, IP Video, FTP)
+    mno_user_cost = Metric_array('mno_user_cost') # float
+    mvno_user_cost = Metric_array('mvno_user_cost') # float
+    mno_cloud_task_num = Metric_array('mno_cloud_task_num', (3,), np.int64) # (VoIP, IP Video, FTP)
+    mno_edge_task_num = Metric_array('mno_edge_task_num', (3,), np.int64) # (VoIP, IP Video, FTP)
+    mvno_cloud_task_num = Metric_array('mvno_cloud_task_num', (3,), np.int64) # (VoIP, IP Video, FTP)
+    mvno_edge_task_num = Metric_array('mvno_edge_task_num', (3,), np.int64) # (VoIP, IP Video, FTP)
     # parameters
     offset = 0.3
     gap = 0.05
@@ -514,8 +603,17 @@ class Metrics:
         plot_task_num()
         plot_vm_utilization()
     
+    @classmethod
+    def flush(cls) -> None:
+        '''Append the rows of metrics since the last flush into Metrics_store.'''
+        if not Metrics_store.is_open():
+            return
+        metrics = [value for value in vars(cls).values() if isinstance(value, Metric_array) and value.size != 0]
+        Metrics_store.write({metric.name: metric.pop_rows() for metric in metrics})
+
     @classmethod
     def plot(cls):
+        cls.flush()
         cls.statistic_data = np.array(cls.statistic_data)
         cls.hour_data = np.array(cls.hour_data)
         cls.mno_vm_resource = np.array(cls.mno_vm_resource)
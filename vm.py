@@ -10,8 +10,6 @@ class VM:
         self.origin_price = attributes['price']
         self.local_bw_up = 100000 # Kbps
         self.local_bw_down = 100000 # Kbps
-        # the bw and daley to user (runtime)
-        self.from_user = {}
         # the average bw of all user (runtime)
         self.avg_bw_up = None
         self.avg_bw_down = None
\ No newline at end of file
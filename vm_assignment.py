@@ -1,10 +1,25 @@
+import multiprocessing
+from time import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from optimizing import VMAssignmentOptimizing
+from vm_assignment_ilp import VMAssignmentILP
 from contract import Contract
-from utils import (step_logger)
-from parameters import (rnd_seed, _lambda, optimizing_times, _lambda, title4)
+from utils import (step_logger, lazy_message)
+from instruments import Instruments
+from parameters import (rnd_seed, _lambda, optimizing_times, _lambda, title4, vm_assignment_solver, island_num,
+                        migration_interval, island_workers, stall_generations, target_fitness, time_budget, min_diversity)
 import logging
 
+def evolve_island(island, statistic_data: np.array, generations: int):
+    '''Evolve the island of VMAssignment with its own random state, the random state of the caller is kept.'''
+    state = np.random.get_state()
+    np.random.set_state(island.random_state)
+    island.evolve(statistic_data, generations)
+    island.random_state = np.random.get_state()
+    np.random.set_state(state)
+    return island
+
 class VMAssignment:
     '''VM Assignment!!!'''
     def __init__(self, contract: Contract, candidate_vm_id: np.array, vm_list: dict):
@@ -12,14 +27,39 @@ class VMAssignment:
         self.candidate_vm_id = candidate_vm_id
         self.vm_list = vm_list
         self.vm_highest_price = sum([vm.origin_price for vm in vm_list.values()])
+        # the number of generations evolved, and the random state of the island in island model
+        self.generation = 0
+        self.random_state = None
+        # the generations without improvement, start time of the run and the early termination criterion fired
+        self.stall = 0
+        self.start_time = time()
+        self.stop_reason = None
     
-    def run(self, statistic_data: np.array) -> None:
-        '''Start running VM Assignment algorithm.'''
-        for i in range(optimizing_times):
+    def run(self, statistic_data: np.array) -> tuple[np.array, np.array]:
+        '''Start running VM Assignment algorithm, get the vm id of mno and the vm id of mvno.'''
+        if vm_assignment_solver != 'ga':
+            return self.solve(statistic_data)
+        self.start_time = time()
+        if island_num > 1:
+            self.run_islands(statistic_data)
+        else:
+            self.evolve(statistic_data, optimizing_times)
+            Instruments.count('ga_generations', self.generation)
+            if self.stop_reason is not None:
+                logging.info(f'vm assignment stopped by {self.stop_reason} after {self.generation} generations, '
+                             f'{optimizing_times - self.generation} generations saved')
+        return self.candidate_vm_id[np.logical_not(self.optimizing.best_population)], self.candidate_vm_id[self.optimizing.best_population]
+
+    def evolve(self, statistic_data: np.array, generations: int) -> None:
+        '''Evolve the populations for generations or until an early termination criterion fires.'''
+        if self.stop_reason is not None:
+            return
+        for i in range(self.generation, self.generation + generations):
+            self.stall += 1
             with step_logger(f'-----Evolution {i + 1}-----', title4, f'Finished Evolution {i + 1}', logger=logging.debug):
                 new_populations = self.optimizing.step(statistic_data)
-                logging.debug(f'best population {self.candidate_vm_id[self.optimizing.best_population]} '\
-                    f'with cost {self.vm_highest_price - self.optimizing.best_fitness}, with fitness: {self.optimizing.best_fitness}')
+                logging.debug(lazy_message(lambda: f'best population {self.candidate_vm_id[self.optimizing.best_population]} '\
+                    f'with cost {self.vm_highest_price - self.optimizing.best_fitness}, with fitness: {self.optimizing.best_fitness}'))
                 for idx, population in enumerate(new_populations):
                     selected_vm_id = self.candidate_vm_id[population]
                     cost = 0
@@ -28,12 +68,89 @@ class VMAssignment:
                         # _lambda is the discount MNO provide to MVNO
                         cost += self.vm_list[vm_id].origin_price * _lambda
                     fitness = self.vm_highest_price - cost
-                    logging.debug(f'population {idx + 1} {selected_vm_id} with cost: {cost}, fitness: {fitness}')
+                    logging.debug(lazy_message(lambda: f'population {idx + 1} {selected_vm_id} with cost: {cost}, fitness: {fitness}'))
                     self.optimizing.fitness[idx] = fitness
                     # save the population with minimum cost
                     if fitness > self.optimizing.best_fitness:
                         self.optimizing.best_fitness = fitness
                         self.optimizing.best_population = population
-                        logging.debug(f'better population found, update best population to {selected_vm_id}!')
-        return self.candidate_vm_id[np.logical_not(self.optimizing.best_population)], self.candidate_vm_id[self.optimizing.best_population]
-        
+                        self.stall = 0
+                        logging.debug(lazy_message(lambda: f'better population found, update best population to {selected_vm_id}!'))
+            self.generation += 1
+            self.stop_reason = self.check_termination()
+            if self.stop_reason is not None:
+                break
+
+    def check_termination(self) -> str:
+        '''Get the early termination criterion fired, None to go on evolving.'''
+        if stall_generations is not None and self.stall >= stall_generations:
+            return 'stall generations'
+        if target_fitness is not None and self.optimizing.best_fitness >= target_fitness:
+            return 'target fitness'
+        if time_budget is not None and time() - self.start_time >= time_budget:
+            return 'time budget'
+        if min_diversity is not None and self.optimizing.get_diversity() <= min_diversity:
+            return 'diversity collapse'
+        return None
+
+    def run_islands(self, statistic_data: np.array) -> None:
+        '''
+        Island model: evolve island_num independent populations with their own seeds in a process pool, every
+        migration_interval generations the best population of each island replaces the worst one of the next island.
+        The best population of all islands becomes the best population.
+        '''
+        islands = []
+        for seed in np.random.randint(0, 2 ** 31, island_num):
+            island = VMAssignment(self.optimizing.contract, self.candidate_vm_id, self.vm_list)
+            island.random_state = np.random.RandomState(seed).get_state()
+            island.start_time = self.start_time
+            islands.append(island)
+        # the islands are evolved one by one in this process if fork is not available
+        pool = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool = ProcessPoolExecutor(max_workers=island_workers, mp_context=multiprocessing.get_context('fork'))
+        try:
+            for start in range(0, optimizing_times, migration_interval):
+                generations = min(migration_interval, optimizing_times - start)
+                args = (islands, [statistic_data] * island_num, [generations] * island_num)
+                islands = list(pool.map(evolve_island, *args) if pool is not None else map(evolve_island, *args))
+                self.migrate(islands)
+                # every island stops by its own criterion
+                if all(island.stop_reason is not None for island in islands):
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        # the islands are evolved in the worker processes, only the generations and the checks come back
+        Instruments.count('ga_generations', sum(island.generation for island in islands))
+        if pool is not None:
+            Instruments.count('check_condition', sum(island.optimizing.condition_checks for island in islands))
+        for idx, island in enumerate(islands):
+            logging.info(f'island {idx + 1} best fitness: {island.optimizing.best_fitness}')
+            if island.stop_reason is not None:
+                logging.info(f'island {idx + 1} stopped by {island.stop_reason} after {island.generation} generations, '
+                             f'{optimizing_times - island.generation} generations saved')
+            if island.optimizing.best_fitness > self.optimizing.best_fitness:
+                self.optimizing.best_fitness = island.optimizing.best_fitness
+                self.optimizing.best_population = island.optimizing.best_population
+
+    @staticmethod
+    def migrate(islands: list) -> None:
+        '''The best population of each island replaces the worst population of the next island in the ring.'''
+        best = [(island.optimizing.best_population, island.optimizing.best_fitness) for island in islands]
+        for idx, island in enumerate(islands):
+            population, fitness = best[idx - 1]
+            if population is None or len(islands) == 1:
+                continue
+            worst = int(np.argmin(island.optimizing.fitness))
+            island.optimizing.new_populations[worst] = population
+            island.optimizing.fitness[worst] = fitness
+
+    def solve(self, statistic_data: np.array) -> tuple[np.array, np.array]:
+        '''Get the vm assignment by VMAssignmentILP instead of the genetic algorithm.'''
+        self.solver = VMAssignmentILP(self.optimizing)
+        population = self.solver.solve(statistic_data, vm_assignment_solver)
+        cost = sum(self.vm_list[vm_id].origin_price * _lambda for vm_id in self.candidate_vm_id[population])
+        self.optimizing.best_population = population
+        self.optimizing.best_fitness = self.vm_highest_price - cost
+        return self.candidate_vm_id[np.logical_not(population)], self.candidate_vm_id[population]
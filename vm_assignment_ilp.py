@@ -0,0 +1,53 @@
+import numpy as np
+from time import time
+from scipy.optimize import (milp, LinearConstraint, Bounds)
+from optimizing import VMAssignmentOptimizing
+from parameters import (ilp_time_limit)
+import logging
+
+class VMAssignmentILP:
+    '''
+    Solve the vm assignment as 0/1 integer program: choose the vm set of mvno with the minimum price, subject to
+    the demand of each task type and the bounds of contract, the same conditions as VMAssignmentOptimizing.check_condition.
+    milp: exact branch and bound of scipy (HiGHS), stop at ilp_time_limit with the best vm set found.
+    lp_rounding: solve the LP relaxation, round it and repair the rounded vm set by VMAssignmentOptimizing.repair.
+    '''
+    def __init__(self, optimizing: VMAssignmentOptimizing):
+        self.optimizing = optimizing
+        # the result of the last solve
+        self.lower_bound = None
+        self.gap = None
+        self.solve_time = None
+
+    def get_constraints(self, statistic_data: np.array) -> LinearConstraint:
+        '''The demand of each task type and the bounds of contract on the sum of (bw_up, bw_down, cr) as linear constraint.'''
+        return LinearConstraint(*self.optimizing.get_linear_conditions(statistic_data))
+
+    def solve(self, statistic_data: np.array, method: str) -> np.array:
+        '''Get the vm set of mvno with the minimum price by method milp or lp_rounding, and record the optimality gap and solve time.'''
+        start = time()
+        prices = self.optimizing.prices
+        constraints = self.get_constraints(statistic_data)
+        if method not in ('milp', 'lp_rounding'):
+            raise ValueError(f'invalid value {method} of vm assignment solver')
+        # lp_rounding solves the LP relaxation without integrality
+        integrality = np.full(len(prices), 1 if method == 'milp' else 0)
+        result = milp(prices, constraints=constraints, integrality=integrality, bounds=Bounds(0, 1),
+                      options={'time_limit': ilp_time_limit})
+        if result.x is None:
+            raise ValueError(f'Improper parameters setting cause no legal vm assignment, {result.message}')
+        selected_vm = result.x > 0.5
+        # the lower bound of price, the dual bound of branch and bound or the optimum of LP relaxation
+        lower_bound = result.fun
+        if method == 'milp' and result.mip_gap is not None:
+            lower_bound = result.fun - result.mip_gap * abs(result.fun)
+        # the solution within the tolerance of solver may break the conditions slightly
+        if not self.optimizing.check_condition(selected_vm, statistic_data):
+            selected_vm = self.optimizing.repair(selected_vm, statistic_data)
+        cost = prices[selected_vm].sum()
+        self.solve_time = time() - start
+        self.lower_bound = lower_bound
+        self.gap = (cost - lower_bound) / cost if cost > 0 else 0
+        logging.info(f'{method} solved vm assignment with price {cost}, lower bound {lower_bound}, '
+                     f'optimality gap {self.gap:.4%}, solve time {self.solve_time:.4f}s')
+        return selected_vm